@@ -1,9 +1,11 @@
 import base64
+import concurrent.futures
 import json
 import niquests
 import datetime
 import logging
 import bs4
+import typing
 from django.utils import timezone
 
 from . import models, aztec, ticket, apn
@@ -11,11 +13,11 @@ from . import models, aztec, ticket, apn
 logger = logging.getLogger(__name__)
 
 
-def update_all():
+def update_all(pool: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None):
     now = timezone.now()
     for abo in models.DBSubscription.objects.all():
         if abo.refresh_at <= now:
-            update_abo_tickets(abo)
+            update_abo_tickets(abo, pool)
         else:
             logging.info(f"Not updating DB subscription {abo.device_token} - not due for refresh")
 
@@ -23,7 +25,9 @@ def update_all():
             apn.notify_ticket_if_renewed(t)
 
 
-def update_abo_tickets(abo: models.DBSubscription):
+def update_abo_tickets(
+        abo: models.DBSubscription, pool: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+):
     r = niquests.post("https://dig-aboprod.noncd.db.de/aboticket/refreshmultiple", json={
         "aboTicketCheckRequestList": [{
             "deviceToken": abo.device_token,
@@ -43,6 +47,7 @@ def update_abo_tickets(abo: models.DBSubscription):
     abo.info = tickets["ticketHuelle"]
     abo.save()
 
+    barcodes = []
     for t in tickets["tickets"]:
         ticket_data = base64.urlsafe_b64decode(t["payload"] + '==')
         ticket_data = json.loads(ticket_data.decode('utf-8'))
@@ -71,17 +76,16 @@ def update_abo_tickets(abo: models.DBSubscription):
             continue
         barcode_img_data = base64.urlsafe_b64decode(data)
         try:
-            barcode_data = aztec.decode(barcode_img_data)
+            barcodes.append(aztec.decode(barcode_img_data))
         except aztec.AztecError as e:
             logger.error("Error decoding barcode image: %s", e)
             continue
 
-        try:
-            ticket_obj = ticket.update_from_subscription_barcode(barcode_data, account=abo.account)
-            ticket_obj.db_subscription = abo
-            ticket_obj.save()
-        except ticket.TicketError as e:
-            logger.error("Error decoding barcode ticket: %s", e)
+    for ticket_obj in ticket.update_from_subscription_barcodes(barcodes, account=abo.account, pool=pool):
+        if isinstance(ticket_obj, ticket.TicketError):
+            logger.error("Error decoding barcode ticket: %s", ticket_obj)
             continue
+        ticket_obj.db_subscription = abo
+        ticket_obj.save()
 
     logging.info(f"Successfully updated DB subscription {abo.device_token}")
\ No newline at end of file
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from main import models, ticket
+
+
+class Command(BaseCommand):
+    help = "Fill the denormalised UIC ticket instance columns from stored barcodes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Recompute columns for all instances")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        instances = models.UICTicketInstance.objects.only("id", "barcode_data")
+        if not options["all"]:
+            instances = instances.filter(ticket_kind__isnull=True)
+
+        batch = []
+        updated = 0
+        failed = 0
+        for instance in instances.iterator(chunk_size=options["batch_size"]):
+            try:
+                ticket_data = ticket.parse_ticket_uic(bytes(instance.barcode_data), summary=True)
+            except ticket.TicketError as e:
+                print(f"Unable to parse UIC ticket instance {instance.id}: {e.title}")
+                failed += 1
+                columns = {**dict.fromkeys(ticket.UIC_INSTANCE_COLUMNS), "ticket_kind": ticket.UIC_TICKET_KIND_UNKNOWN}
+            else:
+                columns = ticket.uic_instance_columns(ticket_data)
+
+            for field, value in columns.items():
+                setattr(instance, field, value)
+            batch.append(instance)
+
+            if len(batch) >= options["batch_size"]:
+                models.UICTicketInstance.objects.bulk_update(batch, ticket.UIC_INSTANCE_COLUMNS)
+                updated += len(batch)
+                batch = []
+
+        if batch:
+            models.UICTicketInstance.objects.bulk_update(batch, ticket.UIC_INSTANCE_COLUMNS)
+            updated += len(batch)
+
+        print(f"Updated {updated} UIC ticket instances, {failed} failed")
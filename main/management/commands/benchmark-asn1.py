@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+import asn1tools
+import pickle
+import subprocess
+import sys
+import time
+from main.uic import flex
+
+SAMPLE = {
+    "issuingDetail": {
+        "issuingYear": 2024,
+        "issuingDay": 100,
+        "issuingTime": 600,
+        "specimen": False,
+        "securePaperTicket": False,
+        "activated": True,
+        "issuerPNR": "ABC123",
+    }
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark loading the UIC FCB ASN.1 specs from source and from the compiled cache"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import main.uic.flex"], check=True)
+        lazy_import_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        subprocess.run([
+            sys.executable, "-c",
+            "import main.uic.flex, asn1tools\n"
+            "for f in main.uic.flex.SPEC_FILES.values():\n"
+            "    asn1tools.compile_files([f], codec='uper')"
+        ], check=True)
+        eager_import_time = time.perf_counter() - start
+
+        print("Process start and import of main.uic.flex:")
+        print(f"  eager compile: {eager_import_time * 1e3:8.1f}ms")
+        print(f"  lazy:          {lazy_import_time * 1e3:8.1f}ms")
+
+        flex.build_cache()
+        for version, spec_file in flex.SPEC_FILES.items():
+            start = time.perf_counter()
+            spec = asn1tools.compile_files([spec_file], codec="uper")
+            data = spec.encode("UicRailTicketData", SAMPLE)
+            spec.decode("UicRailTicketData", data)
+            source_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with open(flex.spec_cache_path(spec_file), "rb") as f:
+                spec = pickle.load(f)
+            spec.decode("UicRailTicketData", data)
+            cached_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            spec.decode("UicRailTicketData", data)
+            warm_time = time.perf_counter() - start
+
+            print(f"FCB version {version} first decode:")
+            print(f"  from source:   {source_time * 1e3:8.1f}ms")
+            print(f"  from cache:    {cached_time * 1e3:8.1f}ms")
+            print(f"  warm decode:   {warm_time * 1e3:8.3f}ms")
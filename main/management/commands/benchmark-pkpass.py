@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+import hashlib
+import io
+import json
+import os
+import time
+import zipfile
+from main import pkpass
+from main.views import passes
+
+
+def make_pass_json() -> bytes:
+    return json.dumps({
+        "formatVersion": 1,
+        "serialNumber": os.urandom(16).hex(),
+        "authenticationToken": os.urandom(16).hex(),
+        "barcodes": [{
+            "format": "PKBarcodeFormatAztec",
+            "message": os.urandom(400).decode("iso-8859-1"),
+            "messageEncoding": "iso-8859-1",
+        }],
+        "generic": {
+            "backFields": [{"key": f"field-{i}", "label": f"field-{i}-label", "value": "x" * 40} for i in range(20)],
+        },
+    }).encode("utf-8")
+
+
+def build_zipfile(assets, pass_json: bytes, sign: bool) -> bytes:
+    manifest = {}
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w") as zip_file:
+        for filename, asset in assets:
+            manifest[filename] = hashlib.sha1(asset.data).hexdigest()
+            zip_file.writestr(filename, asset.data)
+        manifest["pass.json"] = hashlib.sha1(pass_json).hexdigest()
+        zip_file.writestr("pass.json", pass_json)
+        manifest = json.dumps(manifest).encode("utf-8")
+        zip_file.writestr("manifest.json", manifest)
+        if sign:
+            zip_file.writestr("signature", pkpass.sign_manifest(manifest))
+    return zip_buffer.getvalue()
+
+
+def build_template(assets, pass_json: bytes, sign: bool) -> bytes:
+    pkp = pkpass.PKPass()
+    for filename, asset in assets:
+        pkp.add_asset(filename, asset)
+    pkp.add_file("pass.json", pass_json)
+    if sign:
+        pkp.sign()
+    else:
+        pkp.entries.append(pkpass.ZipEntry.build("manifest.json", pkp.manifest()))
+    return pkp.get_buffer()
+
+
+class Command(BaseCommand):
+    help = "Benchmark assembling pkpass archives with zipfile and with the prebuilt template"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+        parser.add_argument("--sign", action="store_true", help="Include signing with the configured certificate")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        sign = options["sign"]
+        if sign and not (settings.PKPASS_CERTIFICATE and settings.PKPASS_KEY and settings.WWDR_CERTIFICATE):
+            print("No pass signing certificate configured")
+            return
+
+        assets = [(f"{lang}.lproj/pass.strings", asset) for lang, asset in passes.PASS_STRING_ASSETS.items()]
+        for img_name, pass_path in (
+                ("pass/logo.png", "logo"), ("pass/icon.png", "icon"), ("pass/logo-dt.png", "thumbnail")
+        ):
+            for scale, asset in zip(pkpass.IMAGE_SCALES, pkpass.STATIC_ASSETS.get_image_set(img_name)):
+                assets.append((f"{pass_path}{scale}.png", asset))
+        pass_jsons = [make_pass_json() for _ in range(16)]
+
+        for name, builder in (("zipfile", build_zipfile), ("template", build_template)):
+            start = time.perf_counter()
+            for i in range(iterations):
+                builder(assets, pass_jsons[i % len(pass_jsons)], sign)
+            elapsed = time.perf_counter() - start
+            print(f"{name + ':':10} {iterations / elapsed:10.1f} passes/s ({elapsed / iterations * 1e6:8.1f}us per pass)")
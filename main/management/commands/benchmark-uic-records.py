@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+import time
+from main import models, uic
+from main.uic import records
+
+
+def blocks(items, length_width: int) -> bytes:
+    return b"".join(
+        block_id.encode("utf-8") + f"{len(value.encode('utf-8')):0{length_width}d}".encode("ascii") +
+        value.encode("utf-8") for block_id, value in items
+    )
+
+
+SAMPLES = {
+    ("0080BL", 3): b"00" + b"2" + b"A" * 26 + b"B" * 26 + b"10" + blocks([
+        ("S001", "Flexpreis"), ("S002", "2"), ("S015", "Berlin Hbf"), ("S035", "11160"),
+        ("S016", "Hamburg Hbf"), ("S036", "2549"), ("S021", "VIA:ICE"), ("S028", "Max#Mustermann"),
+        ("S031", "01.01.2024"), ("S032", "02.01.2024"),
+    ], 4),
+    ("1154UT", 1): blocks([
+        ("KJ", "Max Mustermann"), ("OD", "01.01.2024 10:00"), ("DO", "02.01.2024 10:00"),
+    ], 3),
+    ("118199", 1): b'{"V":"2401011000","B":"2401021000","Z":"RJ 123"}',
+    ("U_TLAY", 1): b"PLAI" + b"0010" + b"".join(
+        f"{i:02d}000104{i % 8}{len(text):04d}".encode("ascii") + text.encode("utf-8")
+        for i, text in enumerate(["Zugbindung\\naufgehoben"] * 10)
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark the registered UIC record parsers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20000)
+        parser.add_argument("--from-db", action="store_true", help="Benchmark records from stored UIC barcodes")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+
+        corpus = {key: [data] for key, data in SAMPLES.items()}
+        if options["from_db"]:
+            for instance in models.UICTicketInstance.objects.only("barcode_data")[:1000]:
+                try:
+                    envelope = uic.Envelope.parse(bytes(instance.barcode_data))
+                except uic.util.UICException:
+                    continue
+                for record in envelope.records:
+                    if records.get_record_type(record.id, record.version):
+                        corpus.setdefault((record.id, record.version), []).append(record.data)
+
+        for (record_id, version), payloads in sorted(corpus.items()):
+            record_type = records.get_record_type(record_id, version)
+            rounds = max(1, iterations // len(payloads))
+            count = rounds * len(payloads)
+            failures = 0
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for payload in payloads:
+                    try:
+                        record_type.parse(payload)
+                    except record_type.exception:
+                        failures += 1
+            parse_time = (time.perf_counter() - start) / count
+
+            print(f"{record_type.name} ({record_id} v{version}, {len(payloads)} payloads):")
+            print(f"  parse:    {parse_time * 1e6:8.1f}us")
+            if failures:
+                print(f"  failures: {failures // rounds}")
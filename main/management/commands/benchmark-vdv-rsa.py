@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+import cryptography.hazmat.primitives.asymmetric.padding
+import cryptography.hazmat.primitives.asymmetric.rsa
+import cryptography.hazmat.primitives.hashes
+import hashlib
+import time
+from main import vdv
+from main.vdv import rsa, iso9796
+
+PROFILES = (
+    (4, 1024),
+    (3, 1536),
+    (7, 1984),
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the RSA backends used for VDV certificate verification"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+
+        for profile, bits in PROFILES:
+            private_key = cryptography.hazmat.primitives.asymmetric.rsa.generate_private_key(65537, bits)
+            private_numbers = private_key.private_numbers()
+            modulus_len = bits // 8
+            public_key = vdv.pki.RSAPublicKey.from_bytes(
+                private_numbers.public_numbers.n.to_bytes(modulus_len, "big") +
+                private_numbers.public_numbers.e.to_bytes(3, "big"),
+                profile
+            )
+
+            content = b"certificate content"
+            pkcs1_signature = private_key.sign(
+                content,
+                cryptography.hazmat.primitives.asymmetric.padding.PKCS1v15(),
+                cryptography.hazmat.primitives.hashes.SHA1()
+            )
+
+            message = bytes(range(256))[:modulus_len - 22]
+            residual = b"residual data"
+            iso9796_message = b"\x6a" + message + hashlib.sha1(message + residual).digest() + b"\xbc"
+            iso9796_signature = pow(
+                int.from_bytes(iso9796_message, "big"), private_numbers.d, private_numbers.public_numbers.n
+            ).to_bytes(modulus_len, "big")
+            certificate_data = vdv.CertificateData(
+                certificate_profile_identifier=profile,
+                ca_reference=vdv.CAReference.root(),
+                certificate_holder_reference=vdv.CAReference.root(),
+                certificate_holder_authorization=None,
+                expiry_date=None,
+                public_key=public_key,
+            )
+
+            print(f"RSA-{bits} (profile {profile}):")
+            for backend in rsa.BACKENDS.values():
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    backend.verify_pkcs1_sha1(public_key, pkcs1_signature, content)
+                verify_time = (time.perf_counter() - start) / iterations
+
+                with override_settings(VDV_RSA_BACKEND=backend.name):
+                    start = time.perf_counter()
+                    for _ in range(iterations):
+                        iso9796.decrypt_with_cert(iso9796_signature, residual, certificate_data)
+                    recover_time = (time.perf_counter() - start) / iterations
+
+                print(f"  {backend.name:<14} PKCS#1 verify: {verify_time * 1e6:8.1f}us  "
+                      f"ISO 9796-2 recovery: {recover_time * 1e6:8.1f}us")
+
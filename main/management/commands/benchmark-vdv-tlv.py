@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand
+import ber_tlv.tlv
+import os
+import time
+import typing
+from main import vdv, models
+from main.vdv import tlv
+
+SHAPES = (
+    ("Plain certificate, RSA-1024", 128, 128, 64, 0),
+    ("Encrypted certificate, RSA-1024", 0, 128, 106, 0),
+    ("Encrypted certificate, RSA-1536", 0, 192, 106, 0),
+    ("Encrypted certificate, long residual", 0, 128, 106, 250),
+)
+
+
+def encode(tag: int, value: bytes) -> bytes:
+    tag_bytes = tag.to_bytes(2 if tag > 0xFF else 1, "big")
+    if len(value) < 0x80:
+        length = bytes([len(value)])
+    elif len(value) < 0x100:
+        length = bytes([0x81, len(value)])
+    else:
+        length = bytes([0x82]) + len(value).to_bytes(2, "big")
+    return tag_bytes + length + value
+
+
+def make_envelope(content_len: int, signature_len: int, remainder_len: int, residual_len: int) -> bytes:
+    certificate = b""
+    if content_len:
+        certificate += encode(vdv.util.TAG_CERTIFICATE_CONTENT, os.urandom(content_len))
+    certificate += encode(vdv.util.TAG_CERTIFICATE_SIGNATURE, os.urandom(signature_len))
+    if not content_len:
+        certificate += encode(vdv.util.TAG_CERTIFICATE_SIGNATURE_REMAINDER, os.urandom(remainder_len))
+
+    return encode(vdv.util.TAG_SIGNATURE, os.urandom(128)) + \
+        encode(vdv.util.REMAINING_DATA, os.urandom(residual_len or 33)) + \
+        encode(vdv.util.TAG_CERTIFICATE, certificate) + \
+        encode(vdv.util.TAG_CA_REFERENCE, vdv.CAReference.root().to_bytes())
+
+
+def walk(data: memoryview, offset: int = 0, end: typing.Optional[int] = None, depth: int = 0):
+    for tag, offset, length in tlv.iter_elements(data, offset, end, depth):
+        if tag == vdv.util.TAG_CERTIFICATE:
+            walk(data, offset, offset + length, depth + 1)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the VDV BER-TLV decoder against the generic ber_tlv parser"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20000)
+        parser.add_argument("--from-db", action="store_true", help="Benchmark stored VDV barcodes as well")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+
+        corpus = [(shape[0], [make_envelope(*shape[1:])]) for shape in SHAPES]
+        if options["from_db"]:
+            barcodes = [
+                bytes(i.barcode_data) for i in models.VDVTicketInstance.objects.only("barcode_data")[:1000]
+            ]
+            if barcodes:
+                corpus.append((f"Stored barcodes ({len(barcodes)})", barcodes))
+
+        for name, envelopes in corpus:
+            rounds = max(1, iterations // len(envelopes))
+            count = rounds * len(envelopes)
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for envelope in envelopes:
+                    ber_tlv.tlv.Tlv.Parser.parse(envelope, True, [], False, 0)
+            generic_time = (time.perf_counter() - start) / count
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for envelope in envelopes:
+                    walk(memoryview(envelope))
+            walk_time = (time.perf_counter() - start) / count
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for envelope in envelopes:
+                    try:
+                        vdv.EnvelopeV2.parse(envelope)
+                    except vdv.util.VDVException:
+                        pass
+            parse_time = (time.perf_counter() - start) / count
+
+            print(f"{name}:")
+            print(f"  ber_tlv parse:      {generic_time * 1e6:8.1f}us")
+            print(f"  tlv walk:           {walk_time * 1e6:8.1f}us ({generic_time / walk_time:.1f}x)")
+            print(f"  EnvelopeV2.parse:   {parse_time * 1e6:8.1f}us")
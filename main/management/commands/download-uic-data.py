@@ -1,17 +1,15 @@
 from django.core.management.base import BaseCommand
-import django.core.files.storage
 import niquests
 import csv
 import datetime
 import json
+from main import uic, storage
 
 
 class Command(BaseCommand):
     help = "Download VDV certificates from LDAP"
 
     def handle(self, *args, **options):
-        uic_storage = django.core.files.storage.storages["uic-data"]
-
         rics_codes_r = niquests.get("https://teleref.era.europa.eu/Download_CompanycodesExcel.aspx", headers={
             "User-Agent": "VDV PKPass Generator (magicalcodewit.ch)",
         })
@@ -39,8 +37,7 @@ class Command(BaseCommand):
                 "url": row["URL"] if row["URL"] else None,
             }
 
-        with uic_storage.open("rics_codes.json", "w") as f:
-            json.dump(out, f)
+        storage.write_file("uic-data", "rics_codes.json", json.dumps(out).encode("utf-8"))
 
         stations_r = niquests.get("https://github.com/trainline-eu/stations/raw/refs/heads/master/stations.csv", headers={
             "User-Agent": "VDV PKPass Generator (magicalcodewit.ch)",
@@ -68,5 +65,18 @@ class Command(BaseCommand):
             if row["db_id"]:
                 out["db_ids"][row["db_id"]] = len(out["stations"]) - 1
 
-        with uic_storage.open("stations.json", "w") as f:
-            json.dump(out, f)
+        storage.write_file("uic-data", "stations.json", json.dumps(out).encode("utf-8"))
+        storage.write_file("uic-data", uic.stations.INDEX_FILENAME, uic.stations.build_index(out["stations"]))
+        storage.write_file(
+            "uic-data", uic.station_names.INDEX_FILENAME, uic.station_names.build_index(out["stations"])
+        )
+
+        public_keys_r = niquests.get("https://railpublickey.uic.org/download.php", headers={
+            "User-Agent": "VDV PKPass Generator (magicalcodewit.ch)",
+        })
+        public_keys_r.raise_for_status()
+        public_keys = uic.signature.parse_public_keys(public_keys_r.content)
+
+        storage.write_file("uic-data", uic.signature.KEYS_FILENAME, public_keys_r.content)
+
+        print(f"Loaded {len(public_keys)} UIC public keys")
@@ -1,19 +1,19 @@
 from django.core.management.base import BaseCommand
-import django.core.files.storage
 import ldap
+from main import vdv, ticket, storage
 
 
 class Command(BaseCommand):
     help = "Download VDV certificates from LDAP"
 
     def handle(self, *args, **options):
-        certificate_storage = django.core.files.storage.storages["vdv-certs"]
-
         conn = ldap.initialize("ldap://ldap-vdv-ion.telesec.de:389")
 
         conn.search("ou=VDV KA,o=VDV Kernapplikations GmbH,c=de", ldap.SCOPE_SUBTREE, "(objectClass=*)", attrlist=["cn", "caCertificate"])
         certs = conn.result()[1]
 
+        pki_store = vdv.CertificateStore()
+
         for cert in certs:
             attrs = cert[1]
             if "cACertificate" not in attrs:
@@ -21,6 +21,34 @@ class Command(BaseCommand):
             cert_data = attrs["cACertificate"][0]
             common_name = attrs["cn"][0].decode("ascii")
 
-            with certificate_storage.open(f"{common_name}.der", "wb") as f:
-                f.write(cert_data)
-            print(f"Downloaded {common_name}")
\ No newline at end of file
+            storage.write_file("vdv-certs", f"{common_name}.der", cert_data)
+            print(f"Downloaded {common_name}")
+
+            try:
+                ca_reference = vdv.CAReference.from_bytes(bytes.fromhex(common_name))
+            except ValueError:
+                continue
+            pki_store.certificates[ca_reference] = vdv.pki.RawCertificate(
+                filename=f"{common_name}.der",
+                ca_reference=ca_reference,
+                data=cert_data
+            )
+
+        try:
+            root_ca_data = ticket.get_root_ca(pki_store)
+        except ticket.TicketError as e:
+            print(f"Unable to verify root CA: {e.message}")
+            root_ca_data = None
+
+        entries = []
+        for ca_reference, raw_certificate in pki_store.certificates.items():
+            if root_ca_data and ca_reference != vdv.CAReference.root():
+                try:
+                    ticket.get_issuing_ca(pki_store, ca_reference, root_ca_data)
+                except ticket.TicketError as e:
+                    print(f"Unable to verify {ca_reference.hex_name()}: {e.title}")
+
+            entries.append(vdv.bundle.BundleEntry(ca_reference=ca_reference, data=raw_certificate.data))
+
+        storage.write_file("vdv-certs", vdv.bundle.BUNDLE_FILENAME, vdv.bundle.write_bundle(entries))
+        print(f"Wrote bundle with {len(entries)} certificates")
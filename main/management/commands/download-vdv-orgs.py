@@ -1,15 +1,13 @@
 from django.core.management.base import BaseCommand
-import django.core.files.storage
 import niquests
 import json
+from main import storage
 
 
 class Command(BaseCommand):
     help = "Download VDV organisation names"
 
     def handle(self, *args, **options):
-        storage = django.core.files.storage.storages["vdv-certs"]
-
         r = niquests.get(
             "https://pro.eticket.app/api/organisations/all",
             auth=("eticket-app-pro", "VDV-K3rn4ppl!kat1on"),
@@ -33,5 +31,4 @@ class Command(BaseCommand):
                 out["vdv_ids"][org["id"]] = org_pos
                 out["vdv_test_ids"][org["test_id"]] = org_pos
 
-        with storage.open("orgs.json", "w") as f:
-            json.dump(out, f)
+        storage.write_file("vdv-certs", "orgs.json", json.dumps(out).encode("utf-8"))
@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import concurrent.futures
+import django
+import django.db
+import multiprocessing
+import os
+import time
+from main import models, apn, pkpass
+from main.views import passes
+
+
+def ticket_id_chunks(chunk_size: int):
+    last_id = None
+    while True:
+        tickets = models.Ticket.objects.order_by("id")
+        if last_id is not None:
+            tickets = tickets.filter(id__gt=last_id)
+        chunk = list(tickets.values_list("id", flat=True)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+class Command(BaseCommand):
+    help = "Rebuild the signed pass of every ticket and optionally push the update to devices"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--chunk-size", type=int, default=100)
+        parser.add_argument("--push", action="store_true", help="Mark passes as updated and notify devices")
+        parser.add_argument("--wave-size", type=int, default=100, help="Tickets to notify per push wave")
+        parser.add_argument("--wave-interval", type=float, default=10, help="Seconds between push waves")
+        parser.add_argument(
+            "--local", action="store_true",
+            help="Allow writing to this host's artifact root when PKPASS_ARTIFACT_ROOT isn't set"
+        )
+
+    def handle(self, *args, **options):
+        if not settings.PKPASS_ARTIFACT_ROOT and not options["local"]:
+            raise CommandError(
+                f"PKPASS_ARTIFACT_ROOT isn't set, passes would only be written to {pkpass.ARTIFACTS.root} on this "
+                f"host and not be served by other web workers. Set it to a shared volume, or pass --local."
+            )
+
+        workers = max(1, options["workers"])
+        chunks = ticket_id_chunks(options["chunk_size"])
+
+        print(f"Writing passes to {pkpass.ARTIFACTS.root} with build {passes.pkpass_build_fingerprint()}")
+
+        build_times = []
+        failures = []
+        regenerated = []
+        start = time.perf_counter()
+
+        django.db.connections.close_all()
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=django.setup
+        ) as executor:
+            pending = set()
+            while True:
+                while len(pending) < workers * 2 and (chunk := next(chunks, None)):
+                    pending.add(executor.submit(passes.regenerate_pkpasses, chunk, options["push"]))
+                if not pending:
+                    break
+
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    for ticket_id, build_time, error in future.result():
+                        build_times.append(build_time)
+                        if error:
+                            failures.append((ticket_id, error))
+                            print(f"Unable to regenerate pass for {ticket_id}: {error}")
+                        else:
+                            regenerated.append(ticket_id)
+
+                print(f"Regenerated {len(regenerated)} passes, {len(failures)} failed")
+
+        elapsed = time.perf_counter() - start
+        build_times.sort()
+        print(f"Regenerated {len(regenerated)} passes in {elapsed:.1f}s "
+              f"({len(regenerated) / elapsed if elapsed else 0:.1f} passes/s), {len(failures)} failed")
+        if build_times:
+            p50 = build_times[len(build_times) // 2]
+            p95 = build_times[min(len(build_times) - 1, int(len(build_times) * 0.95))]
+            print(f"Build time: p50 {p50 * 1e3:.1f}ms, p95 {p95 * 1e3:.1f}ms, max {build_times[-1] * 1e3:.1f}ms")
+
+        if not options["push"]:
+            return
+
+        pushed = 0
+        push_failures = 0
+        wave_size = max(1, options["wave_size"])
+        for i in range(0, len(regenerated), wave_size):
+            if i:
+                time.sleep(options["wave_interval"])
+            for ticket_obj in models.Ticket.objects.filter(id__in=regenerated[i:i + wave_size]):
+                try:
+                    apn.notify_ticket(ticket_obj)
+                except Exception as e:
+                    print(f"Unable to notify devices for {ticket_obj.id}: {e}")
+                    push_failures += 1
+                else:
+                    pushed += 1
+            print(f"Notified {pushed} tickets, {push_failures} failed")
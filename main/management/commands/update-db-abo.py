@@ -1,9 +1,15 @@
 from django.core.management.base import BaseCommand
 import main.db_abo
+import main.ticket
 
 
 class Command(BaseCommand):
     help = "Update DB subscription tickets"
 
     def handle(self, *args, **options):
-        main.db_abo.update_all()
+        pool = main.ticket.vdv_parse_pool()
+        try:
+            main.db_abo.update_all(pool)
+        finally:
+            if pool:
+                pool.shutdown()
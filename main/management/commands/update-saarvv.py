@@ -1,9 +1,15 @@
 from django.core.management.base import BaseCommand
 import main.saarvv
+import main.ticket
 
 
 class Command(BaseCommand):
     help = "Update SaarVV tickets"
 
     def handle(self, *args, **options):
-        main.saarvv.update_all()
+        pool = main.ticket.vdv_parse_pool()
+        try:
+            main.saarvv.update_all(pool)
+        finally:
+            if pool:
+                pool.shutdown()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+import datetime
+from main import ticket
+
+
+class Command(BaseCommand):
+    help = "Load and verify all VDV certificates, reporting broken and expiring chains"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--expiry-warning-days", type=int, default=30)
+
+    def handle(self, *args, **options):
+        try:
+            report = ticket.warm_vdv_pki(
+                expiry_warning=datetime.timedelta(days=options["expiry_warning_days"])
+            )
+        except ticket.TicketError as e:
+            print(f"Unable to verify root CA: {e.message}")
+            return
+
+        print(f"Verified {len(report.verified)} certificates")
+        for ca_reference, e in report.failed:
+            print(f"Unable to verify {ca_reference.hex_name()}: {e.title}")
+        for certificate_data in report.expiring:
+            print(f"{certificate_data.certificate_holder_reference.hex_name()} expires {certificate_data.expiry_date}")
+        if report.next_expiry:
+            print(f"Next expiry: {report.next_expiry}")
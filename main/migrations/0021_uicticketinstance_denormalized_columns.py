@@ -0,0 +1,41 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_rename_saarvv_acccount_ticket_saarvv_account'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uicticketinstance',
+            name='ticket_kind',
+            field=models.CharField(blank=True, db_index=True, max_length=32, null=True, verbose_name='Ticket kind'),
+        ),
+        migrations.AddField(
+            model_name='uicticketinstance',
+            name='from_station_code',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='From station code'),
+        ),
+        migrations.AddField(
+            model_name='uicticketinstance',
+            name='to_station_code',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='To station code'),
+        ),
+        migrations.AddField(
+            model_name='uicticketinstance',
+            name='product_id',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True, verbose_name='Product ID'),
+        ),
+        migrations.AddField(
+            model_name='uicticketinstance',
+            name='traveller_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True, verbose_name='Traveller name hash'),
+        ),
+        migrations.AddField(
+            model_name='uicticketinstance',
+            name='class_code',
+            field=models.CharField(blank=True, max_length=16, null=True, verbose_name='Class'),
+        ),
+    ]
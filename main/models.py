@@ -134,6 +134,12 @@ class UICTicketInstance(models.Model):
     decoded_data = models.JSONField()
     validity_start = models.DateTimeField(blank=True, null=True)
     validity_end = models.DateTimeField(blank=True, null=True)
+    ticket_kind = models.CharField(max_length=32, blank=True, null=True, db_index=True, verbose_name="Ticket kind")
+    from_station_code = models.PositiveIntegerField(blank=True, null=True, db_index=True, verbose_name="From station code")
+    to_station_code = models.PositiveIntegerField(blank=True, null=True, db_index=True, verbose_name="To station code")
+    product_id = models.CharField(max_length=64, blank=True, null=True, db_index=True, verbose_name="Product ID")
+    traveller_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True, verbose_name="Traveller name hash")
+    class_code = models.CharField(max_length=16, blank=True, null=True, verbose_name="Class")
 
     class Meta:
         unique_together = [
@@ -148,19 +154,7 @@ class UICTicketInstance(models.Model):
     def as_ticket(self) -> t.UICTicket:
         config = dacite.Config(type_hooks={bytes: base64.b64decode})
         ticket_envelope = dacite.from_dict(data_class=uic.Envelope, data=self.decoded_data["envelope"], config=config)
-        return t.UICTicket(
-            raw_bytes=self.barcode_data,
-            envelope=ticket_envelope,
-            head=t.parse_ticket_uic_head(ticket_envelope),
-            layout=t.parse_ticket_uic_layout(ticket_envelope),
-            flex=t.parse_ticket_uic_flex(ticket_envelope),
-            db_bl=t.parse_ticket_uic_db_bl(ticket_envelope),
-            cd_ut=t.parse_ticket_uic_cd_ut(ticket_envelope),
-            oebb_99=t.parse_ticket_uic_oebb_99(ticket_envelope),
-            other_records=[r for r in ticket_envelope.records if not (
-                    r.id.startswith("U_") or r.id == "0080BL" or r.id == "1154UT" or r.id == "118199"
-            )]
-        )
+        return t.uic_ticket_from_envelope(self.barcode_data, ticket_envelope)
 
 
 class AppleDevice(models.Model):
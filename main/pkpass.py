@@ -1,38 +1,295 @@
+import collections
+import contextlib
+import dataclasses
+import fcntl
 import hashlib
 import json
-import zipfile
-import io
+import os
+import pathlib
+import re
+import struct
+import tempfile
+import threading
+import typing
+import zlib
 import cryptography.hazmat.primitives.hashes
 import cryptography.hazmat.primitives.serialization.pkcs7
 from django.conf import settings
+from django.core.files.storage import storages
+from . import storage
+
+IMAGE_SCALES = ("", "@2x", "@3x")
+TEMPLATE_CACHE_SIZE = 256
+
+LOCAL_FILE_HEADER = struct.Struct("<4s2B4HL2L2H")
+CENTRAL_DIRECTORY_HEADER = struct.Struct("<4s4B4HL2L5HL")
+END_OF_CENTRAL_DIRECTORY = struct.Struct("<4s4H2LH")
+ZIP_VERSION = 20
+ZIP_SYSTEM_UNIX = 3
+# 1980-01-01 00:00:00
+ZIP_TIME = 0
+ZIP_DATE = (1 << 5) | 1
+ZIP_EXTERNAL_ATTR = 0o100644 << 16
+
+
+@dataclasses.dataclass(frozen=True)
+class Asset:
+    data: bytes
+    file_hash: str
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Asset":
+        return cls(data=data, file_hash=hashlib.sha1(data).hexdigest())
+
+
+class AssetCache:
+    def __init__(self, storage_name: str):
+        self.storage_name = storage_name
+        self.image_sets: typing.Dict[str, typing.Tuple[Asset, ...]] = {}
+        self.lock = threading.Lock()
+
+    def load_image_set(self, img_name: str) -> typing.Tuple[Asset, ...]:
+        img_name, img_name_ext = img_name.rsplit(".", 1)
+        storage = storages[self.storage_name]
+        image_set = []
+        for scale in IMAGE_SCALES:
+            with storage.open(f"{img_name}{scale}.{img_name_ext}", "rb") as f:
+                image_set.append(Asset.from_bytes(f.read()))
+        return tuple(image_set)
+
+    def get_image_set(self, img_name: str) -> typing.Tuple[Asset, ...]:
+        if (image_set := self.image_sets.get(img_name)) is not None:
+            return image_set
+
+        with self.lock:
+            if img_name not in self.image_sets:
+                self.image_sets[img_name] = self.load_image_set(img_name)
+            return self.image_sets[img_name]
+
+    def clear(self):
+        with self.lock:
+            self.image_sets.clear()
+
+    def directory_hash(self, directory: str) -> bytes:
+        storage = storages[self.storage_name]
+        directory_hash = hashlib.sha256()
+        for filename in sorted(storage.listdir(directory)[1]):
+            with storage.open(f"{directory}/{filename}", "rb") as f:
+                directory_hash.update(f"{filename}:{hashlib.sha1(f.read()).hexdigest()}\n".encode("utf-8"))
+        return directory_hash.digest()
+
+
+STATIC_ASSETS = AssetCache("staticfiles")
+
+
+@dataclasses.dataclass(frozen=True)
+class ZipEntry:
+    filename: bytes
+    local_record: bytes
+    central_header: bytes
+
+    @classmethod
+    def build(cls, filename: str, data: bytes) -> "ZipEntry":
+        filename = filename.encode("utf-8")
+        crc = zlib.crc32(data)
+        return cls(
+            filename=filename,
+            local_record=LOCAL_FILE_HEADER.pack(
+                b"PK\x03\x04", ZIP_VERSION, 0, 0x800, 0, ZIP_TIME, ZIP_DATE, crc, len(data), len(data),
+                len(filename), 0
+            ) + filename + data,
+            central_header=CENTRAL_DIRECTORY_HEADER.pack(
+                b"PK\x01\x02", ZIP_VERSION, ZIP_SYSTEM_UNIX, ZIP_VERSION, 0, 0x800, 0, ZIP_TIME, ZIP_DATE,
+                crc, len(data), len(data), len(filename), 0, 0, 0, 0, ZIP_EXTERNAL_ATTR
+            ),
+        )
+
+    def central_record(self, offset: int) -> bytes:
+        return self.central_header + offset.to_bytes(4, "little") + self.filename
+
+
+def end_of_central_directory(entry_count: int, central_directory: bytes, offset: int) -> bytes:
+    return central_directory + END_OF_CENTRAL_DIRECTORY.pack(
+        b"PK\x05\x06", 0, 0, entry_count, entry_count, len(central_directory), offset, 0
+    )
+
+
+def stream_archive(files: typing.Iterable[typing.Tuple[str, bytes]]) -> typing.Iterator[bytes]:
+    central_directory = []
+    offset = 0
+    for filename, data in files:
+        entry = ZipEntry.build(filename, data)
+        central_directory.append(entry.central_record(offset))
+        offset += len(entry.local_record)
+        yield entry.local_record
+
+    yield end_of_central_directory(len(central_directory), b"".join(central_directory), offset)
+
+
+class Template:
+    def __init__(self, assets: typing.Sequence[typing.Tuple[str, Asset]]):
+        entries = [ZipEntry.build(filename, asset.data) for filename, asset in assets]
+        central_directory = []
+        offset = 0
+        for entry in entries:
+            central_directory.append(entry.central_record(offset))
+            offset += len(entry.local_record)
+
+        self.entry_count = len(entries)
+        self.local_records = b"".join(entry.local_record for entry in entries)
+        self.central_directory = b"".join(central_directory)
+        self.manifest_fragment = json.dumps({filename: asset.file_hash for filename, asset in assets})[1:-1]
+
+    def assemble(self, entries: typing.Sequence[ZipEntry]) -> bytes:
+        local_records = [self.local_records]
+        central_directory = [self.central_directory]
+        offset = len(self.local_records)
+        for entry in entries:
+            local_records.append(entry.local_record)
+            central_directory.append(entry.central_record(offset))
+            offset += len(entry.local_record)
+
+        central_directory = b"".join(central_directory)
+        return b"".join(local_records) + \
+            end_of_central_directory(self.entry_count + len(entries), central_directory, offset)
+
+
+class TemplateCache:
+    def __init__(self):
+        self.templates = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, assets: typing.Sequence[typing.Tuple[str, Asset]]) -> Template:
+        key = tuple((filename, asset.file_hash) for filename, asset in assets)
+        with self.lock:
+            if (template := self.templates.get(key)) is not None:
+                self.templates.move_to_end(key)
+                return template
+
+        template = Template(assets)
+        with self.lock:
+            self.templates[key] = template
+            while len(self.templates) > TEMPLATE_CACHE_SIZE:
+                self.templates.popitem(last=False)
+        return template
+
+    def clear(self):
+        with self.lock:
+            self.templates.clear()
+
+
+TEMPLATES = TemplateCache()
+
+
+def sign_manifest(manifest: bytes) -> bytes:
+    return cryptography.hazmat.primitives.serialization.pkcs7.PKCS7SignatureBuilder()\
+            .set_data(manifest)\
+            .add_signer(
+                settings.PKPASS_CERTIFICATE, settings.PKPASS_KEY,
+                cryptography.hazmat.primitives.hashes.SHA256()
+            )\
+            .add_certificate(settings.WWDR_CERTIFICATE)\
+            .sign(cryptography.hazmat.primitives.serialization.Encoding.DER, [
+                cryptography.hazmat.primitives.serialization.pkcs7.PKCS7Options.Binary,
+                cryptography.hazmat.primitives.serialization.pkcs7.PKCS7Options.DetachedSignature,
+            ])
+
 
 class PKPass:
     def __init__(self):
-        self.manifest = {}
-        self.zip_buffer = io.BytesIO()
-        self.zip = zipfile.ZipFile(self.zip_buffer, "w")
+        self.assets = []
+        self.entries = []
+        self.file_hashes = {}
+        self.template = None
+
+    def add_file(self, filename: str, data: bytes, file_hash: typing.Optional[str] = None):
+        if file_hash is None:
+            file_hash = hashlib.sha1(data).hexdigest()
+        self.entries.append(ZipEntry.build(filename, data))
+        self.file_hashes[filename] = file_hash
+
+    def add_asset(self, filename: str, asset: Asset):
+        self.assets.append((filename, asset))
+
+    def get_template(self) -> Template:
+        if self.template is None:
+            self.template = TEMPLATES.get(self.assets)
+        return self.template
 
-    def add_file(self, filename: str, data: bytes):
-        file_hash = hashlib.sha1(data).hexdigest()
-        self.zip.writestr(filename, data)
-        self.manifest[filename] = file_hash
+    def manifest(self) -> bytes:
+        fragments = [self.get_template().manifest_fragment, json.dumps(self.file_hashes)[1:-1]]
+        return ("{" + ", ".join(f for f in fragments if f) + "}").encode("utf-8")
 
     def sign(self):
-        manifest = json.dumps(self.manifest).encode("utf-8")
-        self.zip.writestr("manifest.json", manifest)
-        signature = cryptography.hazmat.primitives.serialization.pkcs7.PKCS7SignatureBuilder()\
-                .set_data(manifest)\
-                .add_signer(
-                    settings.PKPASS_CERTIFICATE, settings.PKPASS_KEY,
-                    cryptography.hazmat.primitives.hashes.SHA256()
-                )\
-                .add_certificate(settings.WWDR_CERTIFICATE)\
-                .sign(cryptography.hazmat.primitives.serialization.Encoding.DER, [
-                    cryptography.hazmat.primitives.serialization.pkcs7.PKCS7Options.Binary,
-                    cryptography.hazmat.primitives.serialization.pkcs7.PKCS7Options.DetachedSignature,
-                ])
-        self.zip.writestr("signature", signature)
+        manifest = self.manifest()
+        self.entries.append(ZipEntry.build("manifest.json", manifest))
+        self.entries.append(ZipEntry.build("signature", sign_manifest(manifest)))
 
     def get_buffer(self) -> bytes:
-        self.zip.close()
-        return self.zip_buffer.getvalue()
\ No newline at end of file
+        return self.get_template().assemble(self.entries)
+
+
+class SingleFlight:
+    def __init__(self):
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def __call__(self, key: str):
+        with self.lock:
+            entry = self.locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.locks[key]
+
+
+class ArtifactCache:
+    def __init__(self, root: pathlib.Path):
+        self.root = root
+        self.single_flight = SingleFlight()
+
+    def ticket_dir(self, ticket_id: str) -> pathlib.Path:
+        return self.root / re.sub(r"[^0-9A-Za-z_-]", "_", ticket_id)
+
+    def read(self, path: pathlib.Path) -> typing.Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def get_or_build(
+            self, ticket_id: str, key: str, build: typing.Callable[[], bytes], refresh: bool = False
+    ) -> bytes:
+        ticket_dir = self.ticket_dir(ticket_id)
+        path = ticket_dir / f"{key}.pkpass"
+        if not refresh and (data := self.read(path)) is not None:
+            return data
+
+        with self.single_flight(ticket_dir.name):
+            ticket_dir.mkdir(parents=True, exist_ok=True)
+            with open(ticket_dir / "build.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if not refresh and (data := self.read(path)) is not None:
+                    return data
+
+                data = build()
+                with tempfile.NamedTemporaryFile(dir=ticket_dir, delete=False) as f:
+                    f.write(data)
+                os.replace(f.name, path)
+
+                for other in ticket_dir.iterdir():
+                    if other.suffix == ".pkpass" and other != path:
+                        other.unlink(missing_ok=True)
+                return data
+
+
+ARTIFACTS = ArtifactCache(
+    pathlib.Path(settings.PKPASS_ARTIFACT_ROOT) if settings.PKPASS_ARTIFACT_ROOT else storage.LOCAL_ROOT / "pkpass"
+)
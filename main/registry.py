@@ -0,0 +1,155 @@
+import logging
+import os
+import sys
+import threading
+import time
+import types
+import typing
+from django.conf import settings
+from . import storage
+
+logger = logging.getLogger(__name__)
+
+V = typing.TypeVar("V")
+R = typing.TypeVar("R")
+
+
+def freeze(value: typing.Any) -> typing.Any:
+    if isinstance(value, dict):
+        return types.MappingProxyType({k: freeze(v) for k, v in value.items()})
+    elif isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def deep_sizeof(value: typing.Any, seen: typing.Optional[typing.Set[int]] = None) -> int:
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, types.MappingProxyType):
+        size += deep_sizeof(dict(value), seen) - sys.getsizeof({})
+    elif isinstance(value, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(v, seen) for v in value)
+    elif hasattr(value, "__dict__"):
+        size += deep_sizeof(vars(value), seen)
+    elif hasattr(value, "__slots__"):
+        size += sum(deep_sizeof(getattr(value, s), seen) for s in value.__slots__ if hasattr(value, s))
+    return size
+
+
+class Registry(typing.Generic[V]):
+    def __init__(self, entries: typing.Dict[int, V]):
+        self.entries = types.MappingProxyType(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, code: int):
+        return code in self.entries
+
+    def get(self, code: int) -> typing.Optional[V]:
+        return self.entries.get(code)
+
+    def get_many(self, codes: typing.Iterable[int]) -> typing.Dict[int, typing.Optional[V]]:
+        return {code: self.entries.get(code) for code in codes}
+
+    def memory_usage(self) -> int:
+        return deep_sizeof(self.entries)
+
+
+class LazyRegistry(typing.Generic[R]):
+    def __init__(self, loader: typing.Callable[[], R]):
+        self.loader = loader
+        self.registry = None
+        self.lock = threading.Lock()
+
+    def get(self) -> R:
+        if (registry := self.registry) is not None:
+            return registry
+
+        with self.lock:
+            if self.registry is None:
+                self.registry = self.loader()
+            return self.registry
+
+    def reset(self):
+        with self.lock:
+            self.registry = None
+
+
+class ReferenceData(LazyRegistry[R]):
+    def __init__(self, storage_name: str, filename: str, loader: typing.Callable[[], R]):
+        super().__init__(loader)
+        self.storage_name = storage_name
+        self.filename = filename
+        self.version = None
+        REFERENCE_DATA.append(self)
+
+    def get(self) -> R:
+        WATCHER.ensure_running()
+        if (registry := self.registry) is not None:
+            return registry
+
+        with self.lock:
+            if self.registry is None:
+                self.version = storage.object_version(self.storage_name, self.filename)
+                self.registry = self.loader()
+            return self.registry
+
+    def reset(self):
+        with self.lock:
+            self.registry = None
+            self.version = None
+
+    def revalidate(self) -> bool:
+        if self.registry is None:
+            return False
+
+        version = storage.object_version(self.storage_name, self.filename, self.version)
+        if version is None or version == self.version:
+            return False
+
+        registry = self.loader()
+        with self.lock:
+            self.registry = registry
+            self.version = version
+        logger.info("Reloaded %s/%s at version %s", self.storage_name, self.filename, version)
+        return True
+
+
+REFERENCE_DATA: typing.List[ReferenceData] = []
+
+
+class ReferenceDataWatcher:
+    def __init__(self):
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def ensure_running(self):
+        if self.pid == os.getpid():
+            return
+
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            if settings.REFERENCE_DATA_REVALIDATE_INTERVAL > 0:
+                threading.Thread(target=self.run, name="reference-data-watcher", daemon=True).start()
+
+    def run(self):
+        while True:
+            time.sleep(settings.REFERENCE_DATA_REVALIDATE_INTERVAL)
+            for reference_data in REFERENCE_DATA:
+                try:
+                    reference_data.revalidate()
+                except Exception:
+                    logger.exception("Unable to revalidate %s/%s", reference_data.storage_name, reference_data.filename)
+
+
+WATCHER = ReferenceDataWatcher()
@@ -1,3 +1,4 @@
+import concurrent.futures
 import niquests
 import secrets
 import hashlib
@@ -7,6 +8,7 @@ import hmac
 import urllib3.util
 import base64
 import logging
+import typing
 from Crypto.Cipher import AES
 from django.core.files.storage import storages
 from . import models, aztec, ticket, apn
@@ -69,15 +71,17 @@ def sign_request(request: niquests.PreparedRequest, device_id: str) -> niquests.
     return request
 
 
-def update_all():
+def update_all(pool: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None):
     for account in models.Account.objects.filter(saarvv_device_id__isnull=False):
-        update_saarvv_tickets(account)
+        update_saarvv_tickets(account, pool)
 
         for t in account.saarvv_tickets.all():
             apn.notify_ticket_if_renewed(t)
 
 
-def update_saarvv_tickets(account: models.Account):
+def update_saarvv_tickets(
+        account: models.Account, pool: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+):
     if not account.saarvv_token or not account.saarvv_device_id:
         return
 
@@ -103,17 +107,17 @@ def update_saarvv_tickets(account: models.Account):
     if r.status_code != 200:
         logger.error(f"Failed to update SaarVV {account.saarvv_device_id}: {r.text}")
     data = r.json()
+    barcodes = []
     for t in data["tickets"].values():
         template = json.loads(t["template"])
         barcode_img = base64.b64decode(template["content"]["images"]["aztec_barcode"])
-        barcode_data = aztec.decode(barcode_img)
-
-        try:
-            ticket_obj = ticket.update_from_subscription_barcode(barcode_data, account=account)
-            ticket_obj.saarvv_account = account
-            ticket_obj.save()
-        except ticket.TicketError as e:
-            logger.error("Error decoding barcode ticket: %s", e)
+        barcodes.append(aztec.decode(barcode_img))
+
+    for ticket_obj in ticket.update_from_subscription_barcodes(barcodes, account=account, pool=pool):
+        if isinstance(ticket_obj, ticket.TicketError):
+            logger.error("Error decoding barcode ticket: %s", ticket_obj)
             continue
+        ticket_obj.saarvv_account = account
+        ticket_obj.save()
 
     logger.info(f"Successfully updated SaarVV {account.saarvv_device_id}")
\ No newline at end of file
@@ -0,0 +1,68 @@
+import mmap
+import os
+import pathlib
+import shutil
+import tempfile
+import typing
+import botocore.exceptions
+import django.core.files.storage
+import storages.utils
+
+LOCAL_ROOT = pathlib.Path(tempfile.gettempdir()) / "vdv-pkpass"
+
+
+def write_file(storage_name: str, filename: str, data: bytes):
+    storage = django.core.files.storage.storages[storage_name]
+    try:
+        path = pathlib.Path(storage.path(filename))
+    except NotImplementedError:
+        with storage.open(filename, "wb") as f:
+            f.write(data)
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as f:
+        f.write(data)
+    os.chmod(f.name, getattr(storage, "file_permissions_mode", None) or 0o644)
+    os.replace(f.name, path)
+
+
+def local_path(storage_name: str, filename: str) -> pathlib.Path:
+    storage = django.core.files.storage.storages[storage_name]
+    local_dir = LOCAL_ROOT / storage_name
+    local_dir.mkdir(parents=True, exist_ok=True)
+    path = local_dir / filename
+    with storage.open(filename, "rb") as src:
+        with tempfile.NamedTemporaryFile(dir=local_dir, delete=False) as dst:
+            shutil.copyfileobj(src, dst)
+    os.replace(dst.name, path)
+    return path
+
+
+def open_mmap(storage_name: str, filename: str) -> mmap.mmap:
+    with open(local_path(storage_name, filename), "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def object_version(storage_name: str, filename: str, etag: typing.Optional[str] = None) -> typing.Optional[str]:
+    storage = django.core.files.storage.storages[storage_name]
+
+    if hasattr(storage, "bucket_name"):
+        params = {"IfNoneMatch": etag} if etag else {}
+        try:
+            r = storage.connection.meta.client.head_object(
+                Bucket=storage.bucket_name, Key=storage._normalize_name(storages.utils.clean_name(filename)), **params
+            )
+        except botocore.exceptions.ClientError as e:
+            status = e.response["ResponseMetadata"]["HTTPStatusCode"]
+            if status == 304:
+                return etag
+            elif status == 404:
+                return None
+            raise
+        return r["ETag"]
+
+    try:
+        return f"{storage.get_modified_time(filename).timestamp()}:{storage.size(filename)}"
+    except (FileNotFoundError, NotImplementedError):
+        return None
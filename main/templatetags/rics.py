@@ -23,6 +23,12 @@ def get_station(value, code_type: str):
     elif code_type == "db":
         return uic.stations.get_station_by_db(value)
 
+@register.filter(name="get_station_by_name")
+def get_station_by_name(value):
+    if match := uic.station_names.get_station_by_name(value):
+        return match[0]
+
+
 @register.filter(name="iso3166")
 def get_country(value):
     return iso3166.countries.get(value).name
@@ -1,3 +1,337 @@
-from django.test import TestCase
+import datetime
+import pathlib
+import tempfile
+import threading
+import time
+import types
+import zlib
+from unittest import mock
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa as crypto_rsa
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from main import models, pkpass, storage, ticket, uic, vdv
+from main.views import passes
 
-# Create your tests here.
+
+def uic_record(record_id: str, version: int, data: bytes) -> bytes:
+    return record_id.encode("ascii") + f"{version:02d}{len(data) + 12:04d}".encode("ascii") + data
+
+
+def uic_barcode(records: bytes) -> bytes:
+    body = zlib.compress(records)
+    return b"#UT01108000001" + bytes(50) + f"{len(body):04d}".encode("ascii") + body
+
+
+def layout_record(field_header: bytes = b"01010110" + b"0", text: bytes = b"Hi") -> bytes:
+    return b"RCT2" + b"0001" + field_header + f"{len(text):04d}".encode("ascii") + text
+
+
+class FlexSummaryTestCase(SimpleTestCase):
+    TICKET = {
+        "issuingDetail": {
+            "issuingYear": 2024, "issuingDay": 100, "issuingTime": 600, "specimen": False,
+            "securePaperTicket": False, "activated": True, "issuerNum": 1080, "issuerPNR": "ABC123",
+            "currency": "EUR", "currencyFract": 2,
+        },
+        "travelerDetail": {"traveler": [{"firstName": "Max", "lastName": "Mustermann", "ticketHolder": True}]},
+        "transportDocument": [
+            {"ticket": ("openTicket", {
+                "returnIncluded": False, "productIdNum": 9999, "fromStationNum": 8000105, "toStationNum": 8000261,
+            })},
+            {"ticket": ("openTicket", {"returnIncluded": False, "productIdNum": 1})},
+        ],
+        "controlDetail": {
+            "identificationByIdCard": False, "identificationByPassportId": False,
+            "passportValidationRequired": False, "onlineValidationRequired": False, "ageCheckRequired": False,
+            "reductionCardCheckRequired": False, "infoText": "Control",
+        },
+    }
+
+    def setUp(self):
+        uic.flex.DECODE_CACHE.clear()
+
+    def test_summary_matches_full_decode(self):
+        for version in uic.flex.SPEC_FILES:
+            with self.subTest(version=version):
+                data = uic.flex.get_spec(version).encode("UicRailTicketData", self.TICKET)
+                full = uic.Flex.parse(version, data)
+                summary = uic.Flex.parse_summary(version, data)
+
+                self.assertEqual(summary.summary["issuingDetail"], full.data["issuingDetail"])
+                self.assertEqual(summary.summary["travelerDetail"], full.data["travelerDetail"])
+                self.assertEqual(summary.summary["transportDocument"], full.data["transportDocument"][:1])
+                self.assertNotIn("controlDetail", summary.summary)
+                self.assertEqual(summary.data, full.data)
+                self.assertEqual(summary.issuing_time(), full.issuing_time())
+
+
+class RSABackendTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.private_key = crypto_rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        numbers = cls.private_key.public_key().public_numbers()
+        cls.public_key = vdv.pki.RSAPublicKey(modulus=numbers.n, modulus_len=256, exponent=numbers.e)
+
+    def sign(self, message: bytes) -> bytes:
+        return self.private_key.sign(message, padding.PKCS1v15(), hashes.SHA1())
+
+    def verifies(self, backend: vdv.rsa.PythonBackend, signature: bytes, message: bytes) -> bool:
+        try:
+            backend.verify_pkcs1_sha1(self.public_key, signature, message)
+        except vdv.util.VDVException:
+            return False
+        return True
+
+    def test_public_operation(self):
+        data = self.sign(b"public operation")
+        expected = vdv.rsa.BACKENDS["python"].public_operation(self.public_key, data)
+        for name, backend in vdv.rsa.BACKENDS.items():
+            with self.subTest(backend=name):
+                self.assertEqual(backend.public_operation(self.public_key, data), expected)
+
+    def test_pkcs1_sha1(self):
+        message = b"VDV ticket certificate"
+        signature = self.sign(message)
+        bad_signature = bytearray(signature)
+        bad_signature[-1] ^= 1
+        cases = [
+            (signature, message, True),
+            (signature, message + b"x", False),
+            (bytes(bad_signature), message, False),
+            (self.private_key.sign(message, padding.PKCS1v15(), hashes.SHA256()), message, False),
+        ]
+        for name, backend in vdv.rsa.BACKENDS.items():
+            for i, (case_signature, case_message, valid) in enumerate(cases):
+                with self.subTest(backend=name, case=i):
+                    self.assertEqual(self.verifies(backend, case_signature, case_message), valid)
+
+
+class LimitTestCase(SimpleTestCase):
+    @override_settings(VDV_MAX_TLV_ELEMENTS=2)
+    def test_tlv_elements(self):
+        self.assertEqual(len(vdv.tlv.elements(b"\x04\x00" * 2)), 2)
+        with self.assertRaises(vdv.util.VDVLimitException):
+            vdv.tlv.elements(b"\x04\x00" * 3)
+
+    @override_settings(VDV_MAX_TLV_DEPTH=2)
+    def test_tlv_depth(self):
+        self.assertEqual(len(vdv.tlv.elements(b"\x04\x00", 2)), 1)
+        with self.assertRaises(vdv.util.VDVLimitException):
+            vdv.tlv.elements(b"\x04\x00", 3)
+
+    @override_settings(UIC_MAX_RECORDS=2)
+    def test_envelope_records(self):
+        record = uic_record("U_TEST", 1, b"data")
+        self.assertEqual(len(list(uic.envelope.iter_records(record * 2))), 2)
+        with self.assertRaises(uic.util.UICLimitException):
+            list(uic.envelope.iter_records(record * 3))
+
+    def test_decompressed_size(self):
+        self.assertEqual(uic.envelope.decompress(zlib.compress(b"a" * 100), 100), b"a" * 100)
+        for size in (101, 100_000):
+            with self.subTest(size=size), self.assertRaises(uic.util.UICLimitException):
+                uic.envelope.decompress(zlib.compress(b"a" * size), 100)
+        with self.assertRaises(uic.util.UICException) as e:
+            uic.envelope.decompress(zlib.compress(b"a" * 50)[:-4], 100)
+        self.assertNotIsInstance(e.exception, uic.util.UICLimitException)
+
+    @override_settings(UIC_MAX_DECOMPRESSED_SIZE=100)
+    def test_ticket_too_large(self):
+        with self.assertRaises(ticket.TicketError) as e:
+            ticket.parse_ticket_uic(uic_barcode(uic_record("U_TEST", 1, bytes(200))))
+        self.assertEqual(e.exception.title, "Ticket too large")
+
+    @override_settings(UIC_MAX_LAYOUT_FIELDS=1)
+    def test_layout_fields(self):
+        self.assertEqual(len(uic.LayoutV1.parse(layout_record()).fields), 1)
+        with self.assertRaises(uic.util.UICLimitException):
+            uic.LayoutV1.parse(b"RCT20002")
+
+
+class CertificateStoreTestCase(SimpleTestCase):
+    CAR_BUNDLED = vdv.pki.CAReference(b"DEVDV", 16, 1, 2020)
+    CAR_STORED = vdv.pki.CAReference(b"DEVDV", 16, 1, 2021)
+    CAR_MISSING = vdv.pki.CAReference(b"DEVDV", 16, 1, 2022)
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = pathlib.Path(temp_dir.name)
+        storages = {**settings.STORAGES, "vdv-certs": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": self.root / "vdv-certs"},
+        }}
+        storage_settings = override_settings(STORAGES=storages)
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        local_root = mock.patch.object(storage, "LOCAL_ROOT", self.root / "local")
+        local_root.start()
+        self.addCleanup(local_root.stop)
+
+    def write_certificate(self, ca_reference: vdv.pki.CAReference, data: bytes):
+        storage.write_file("vdv-certs", f"{ca_reference.to_bytes().hex().upper()}.der", data)
+
+    def certificate_data(self, ca_reference: vdv.pki.CAReference, expiry_date: datetime.date):
+        return vdv.pki.CertificateData(
+            certificate_profile_identifier=0,
+            ca_reference=vdv.pki.CAReference.root(),
+            certificate_holder_reference=ca_reference,
+            certificate_holder_authorization=vdv.pki.CertificateHolderAuthorization(name="TEST", service_indicator=0),
+            expiry_date=vdv.util.Date(year=expiry_date.year, month=expiry_date.month, day=expiry_date.day),
+            public_key=vdv.pki.RSAPublicKey(modulus=1, modulus_len=1, exponent=1),
+        )
+
+    def test_bundle_fallback(self):
+        storage.write_file("vdv-certs", vdv.bundle.BUNDLE_FILENAME, vdv.bundle.write_bundle([
+            vdv.bundle.BundleEntry(ca_reference=self.CAR_BUNDLED, data=b"bundled"),
+        ]))
+        self.write_certificate(self.CAR_STORED, b"stored")
+
+        store = vdv.pki.CertificateStore()
+        store.load_bundle()
+        self.assertEqual(store.find_certificate(self.CAR_BUNDLED).data, b"bundled")
+        self.assertEqual(store.find_certificate(self.CAR_STORED).data, b"stored")
+        self.assertIsNone(store.find_certificate(self.CAR_MISSING))
+        self.assertEqual(store.ca_references(), {self.CAR_BUNDLED, self.CAR_STORED})
+
+    def test_broken_bundle(self):
+        storage.write_file("vdv-certs", vdv.bundle.BUNDLE_FILENAME, vdv.bundle.write_bundle([
+            vdv.bundle.BundleEntry(ca_reference=self.CAR_BUNDLED, data=b"bundled"),
+        ])[:-1])
+        self.write_certificate(self.CAR_BUNDLED, b"stored")
+
+        store = vdv.pki.CertificateStore()
+        store.load_bundle()
+        self.assertIsNone(store.bundle)
+        self.assertEqual(store.find_certificate(self.CAR_BUNDLED).data, b"stored")
+
+    def test_expiry(self):
+        today = datetime.date.today()
+        store = vdv.pki.CertificateStore()
+        self.write_certificate(self.CAR_STORED, b"expired")
+        store.find_certificate(self.CAR_STORED)
+        expired = self.certificate_data(self.CAR_STORED, today - datetime.timedelta(days=1))
+        current = self.certificate_data(self.CAR_MISSING, today + datetime.timedelta(days=30))
+        store.add_verified_certificate(expired)
+        store.add_verified_certificate(current)
+
+        self.assertEqual(store.next_expiry(), today + datetime.timedelta(days=30))
+        self.assertEqual(store.expiring_before(today), [expired])
+
+        with mock.patch.object(store, "fetch_certificate", wraps=store.fetch_certificate) as fetch_certificate:
+            for _ in range(10):
+                self.assertIs(store.find_verified_certificate(self.CAR_STORED), expired)
+            self.assertEqual(fetch_certificate.call_count, 1)
+
+        self.write_certificate(self.CAR_STORED, b"renewed")
+        store.last_expiry_check = today - datetime.timedelta(days=1)
+        self.assertIsNone(store.find_verified_certificate(self.CAR_STORED))
+        self.assertEqual(store.find_certificate(self.CAR_STORED).data, b"renewed")
+        self.assertIs(store.find_verified_certificate(self.CAR_MISSING), current)
+
+
+class ArtifactCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache = pkpass.ArtifactCache(pathlib.Path(temp_dir.name))
+
+    def test_single_flight(self):
+        builds = []
+        results = []
+
+        def build():
+            builds.append(threading.get_ident())
+            time.sleep(0.1)
+            return b"pass"
+
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_build("TICKET", "key", build)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, [b"pass"] * 8)
+
+    def test_key_change(self):
+        self.cache.get_or_build("TICKET", "old", lambda: b"old")
+        self.assertEqual(self.cache.get_or_build("TICKET", "new", lambda: b"new"), b"new")
+        self.assertEqual(self.cache.get_or_build("TICKET", "new", lambda: b"rebuilt"), b"new")
+        self.assertEqual(self.cache.get_or_build("TICKET", "new", lambda: b"rebuilt", refresh=True), b"rebuilt")
+        self.assertEqual(
+            sorted(path.name for path in self.cache.ticket_dir("TICKET").glob("*.pkpass")), ["new.pkpass"]
+        )
+
+
+class ArtifactKeyTestCase(TestCase):
+    def setUp(self):
+        self.reference_data = types.SimpleNamespace(filename="stations.index", version="1", get=lambda: None)
+        for patcher in (
+                mock.patch.object(passes, "pkpass_static_fingerprint", return_value=b"static"),
+                mock.patch.object(passes, "PKPASS_REFERENCE_DATA", (self.reference_data,)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        user = User.objects.create(username="test", first_name="Max", last_name="Mustermann")
+        self.ticket_obj = models.Ticket.objects.create(
+            id="TEST", account=user.account, ticket_type=models.Ticket.TYPE_UNKNOWN, last_updated=timezone.now()
+        )
+        self.instance = models.UICTicketInstance.objects.create(
+            ticket=self.ticket_obj, reference="ABC123", distributor_rics=1080, issuing_time=timezone.now(),
+            barcode_data=b"barcode", decoded_data={}
+        )
+
+    def key(self) -> str:
+        return passes.pkpass_artifact_key(self.ticket_obj, self.instance)
+
+    def test_stable(self):
+        self.assertEqual(self.key(), self.key())
+
+    def test_barcode_change(self):
+        key = self.key()
+        self.instance.barcode_data = b"renewed barcode"
+        self.assertNotEqual(self.key(), key)
+
+    def test_reference_data_reload(self):
+        key = self.key()
+        self.reference_data.version = "2"
+        self.assertNotEqual(self.key(), key)
+
+
+class RecordRegistryTestCase(SimpleTestCase):
+    def uic_ticket(self, *records: uic.envelope.Record) -> ticket.UICTicket:
+        envelope = uic.Envelope(
+            version=1, issuer_rics=1080, signature_key_id=1, signature=b"", records=list(records)
+        )
+        return ticket.UICTicket(
+            raw_bytes=b"", envelope=envelope, head=None, flex=None, other_records=[], signature=None
+        )
+
+    def test_parsed_records(self):
+        layout = uic.envelope.Record(id="U_TLAY", version=1, data=layout_record())
+        unknown = uic.envelope.Record(id="U_TEST", version=1, data=b"data")
+        ticket_data = self.uic_ticket(unknown, layout)
+
+        [(record, value)] = ticket_data.layout_records
+        self.assertIs(record, layout)
+        self.assertIsInstance(value, uic.LayoutV1)
+        self.assertEqual(value.fields[0].text, "Hi")
+        self.assertEqual(ticket_data.parsed_records, [])
+
+    def test_stored_record_fallback(self):
+        # Stored before fixed width fields were validated, int() accepted a sign
+        layout = uic.envelope.Record(id="U_TLAY", version=1, data=layout_record(b"-1010110" + b"0"))
+        db_bl = uic.envelope.Record(id="0080BL", version=3, data=b"03XX")
+        ticket_data = self.uic_ticket(db_bl, layout)
+
+        self.assertEqual(ticket_data.layout_records, [(layout, None)])
+        self.assertEqual(ticket_data.parsed_records, [(db_bl, None)])
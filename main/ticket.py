@@ -1,15 +1,21 @@
 import base64
+import concurrent.futures
 import dataclasses
+import multiprocessing
 import traceback
 import typing
 import datetime
 import Crypto.Hash.TupleHash128
+import django
+from django.conf import settings
 from django.utils import timezone
+from django.utils.crypto import salted_hmac
 from . import models, vdv, uic, templatetags, apn
 
 
 class TicketError(Exception):
     def __init__(self, title, message, exception=None):
+        super().__init__(title, message, exception)
         self.title = title
         self.message = message
         self.exception = exception
@@ -65,12 +71,47 @@ class UICTicket:
     raw_bytes: bytes
     envelope: uic.Envelope
     head: uic.HeadV1
-    layout: typing.Optional[uic.LayoutV1]
     flex: typing.Optional[uic.Flex]
-    db_bl: typing.Optional[uic.db.DBRecordBL]
-    cd_ut: typing.Optional[uic.cd.CDRecordUT]
-    oebb_99: typing.Optional[uic.oebb.OeBBRecord99]
     other_records: typing.List[uic.envelope.Record]
+    signature: uic.signature.SignatureResult
+
+    @property
+    def layout(self) -> typing.Optional[uic.LayoutV1]:
+        return parse_ticket_uic_layout(self.envelope)
+
+    @property
+    def db_bl(self) -> typing.Optional[uic.db.DBRecordBL]:
+        return parse_ticket_uic_db_bl(self.envelope)
+
+    @property
+    def cd_ut(self) -> typing.Optional[uic.cd.CDRecordUT]:
+        return parse_ticket_uic_cd_ut(self.envelope)
+
+    @property
+    def oebb_99(self) -> typing.Optional[uic.oebb.OeBBRecord99]:
+        return parse_ticket_uic_oebb_99(self.envelope)
+
+    @property
+    def layout_records(self) -> typing.List[typing.Tuple[uic.envelope.Record, typing.Any]]:
+        return self.parse_records(lambda r: r.id == "U_TLAY")
+
+    @property
+    def parsed_records(self) -> typing.List[typing.Tuple[uic.envelope.Record, typing.Any]]:
+        return self.parse_records(lambda r: r.id != "U_TLAY")
+
+    def parse_records(
+            self, predicate: typing.Callable[[uic.envelope.Record], bool]
+    ) -> typing.List[typing.Tuple[uic.envelope.Record, typing.Any]]:
+        out = []
+        for record in self.envelope.records:
+            if not (record_type := record.record_type) or not predicate(record):
+                continue
+            try:
+                value = record.parsed
+            except (uic.util.UICException, record_type.exception):
+                value = None
+            out.append((record, value))
+        return out
 
     @property
     def ticket_type(self) -> str:
@@ -78,13 +119,13 @@ class UICTicket:
 
     def type(self) -> str:
         if self.flex:
-            security_num = self.flex.data["issuingDetail"].get("securityProviderNum")
-            issuer_num = self.flex.data["issuingDetail"].get("issuerNum")
-            issuer_name = self.flex.data["issuingDetail"].get("issuerName")
-            if len(self.flex.data.get("transportDocument", [])) >= 1:
-                ticket_type, ticket = self.flex.data["transportDocument"][0]["ticket"]
+            security_num = self.flex.summary["issuingDetail"].get("securityProviderNum")
+            issuer_num = self.flex.summary["issuingDetail"].get("issuerNum")
+            issuer_name = self.flex.summary["issuingDetail"].get("issuerName")
+            if len(self.flex.summary.get("transportDocument", [])) >= 1:
+                ticket_type, ticket = self.flex.summary["transportDocument"][0]["ticket"]
                 if ticket_type == "openTicket":
-                    if len(self.flex.data.get("travelerDetail", {}).get("traveler", [])) >= 1 and \
+                    if len(self.flex.summary.get("travelerDetail", {}).get("traveler", [])) >= 1 and \
                         issuer_num == 1080: # Deutsche Bahn
                         if ticket.get("productIdNum") in (
                                 9999, # Deutschlandticket subscription
@@ -122,21 +163,21 @@ class UICTicket:
         ticket_type = self.type()
 
         if ticket_type == models.Ticket.TYPE_DEUTCHLANDTICKET:
-            passenger = self.flex.data.get("travelerDetail", {}).get("traveler", [{}])[0]
+            passenger = self.flex.summary.get("travelerDetail", {}).get("traveler", [{}])[0]
             dob_year = passenger.get("yearOfBirth", 0)
             dob_month = passenger.get("monthOfBirth", 0)
             dob_day = passenger.get("dayOfBirthInMonth", 0)
             hd.update(b"deutschlandticket")
-            hd.update(self.flex.data["issuingDetail"]["issuerNum"].to_bytes(8, "big"))
+            hd.update(self.flex.summary["issuingDetail"]["issuerNum"].to_bytes(8, "big"))
             hd.update(passenger.get("firstName").encode("utf-8"))
             hd.update(passenger.get("lastName").encode("utf-8"))
             hd.update(f"{dob_year:04d}-{dob_month:02d}-{dob_day:02d}".encode("utf-8"))
             return base64.b32hexencode(hd.digest()).decode("utf-8")
 
         elif ticket_type == models.Ticket.TYPE_BAHNCARD:
-            card = self.flex.data["transportDocument"][0]["ticket"][1]
+            card = self.flex.summary["transportDocument"][0]["ticket"][1]
             hd.update(b"bahncard")
-            hd.update(self.flex.data["issuingDetail"].get("issuerNum", 0).to_bytes(8, "big"))
+            hd.update(self.flex.summary["issuingDetail"].get("issuerNum", 0).to_bytes(8, "big"))
             if "cardIdIA5" in card:
                 hd.update(card["cardIdIA5"].encode("utf-8"))
             else:
@@ -146,8 +187,8 @@ class UICTicket:
         elif ticket_type == models.Ticket.TYPE_FAHRKARTE:
             hd.update(b"fahrkarte")
             if self.flex:
-                ticket = self.flex.data["transportDocument"][0]["ticket"][1]
-                hd.update(self.flex.data["issuingDetail"].get("issuerNum", 0).to_bytes(8, "big"))
+                ticket = self.flex.summary["transportDocument"][0]["ticket"][1]
+                hd.update(self.flex.summary["issuingDetail"].get("issuerNum", 0).to_bytes(8, "big"))
                 if "referenceIA5" in ticket:
                     hd.update(ticket["referenceIA5"].encode("utf-8"))
                 else:
@@ -158,9 +199,9 @@ class UICTicket:
             return base64.b32hexencode(hd.digest()).decode("utf-8")
 
         elif ticket_type == models.Ticket.TYPE_RESERVIERUNG:
-            ticket = self.flex.data["transportDocument"][0]["ticket"][1]
+            ticket = self.flex.summary["transportDocument"][0]["ticket"][1]
             hd.update(b"reservierung")
-            hd.update(self.flex.data["issuingDetail"].get("issuerNum", 0).to_bytes(8, "big"))
+            hd.update(self.flex.summary["issuingDetail"].get("issuerNum", 0).to_bytes(8, "big"))
             if "referenceIA5" in ticket:
                 hd.update(ticket["referenceIA5"].encode("utf-8"))
             else:
@@ -168,7 +209,7 @@ class UICTicket:
             return base64.b32hexencode(hd.digest()).decode("utf-8")
 
         elif ticket_type == models.Ticket.TYPE_INTERRAIL:
-            interrail_pass = self.flex.data["transportDocument"][0]["ticket"][1]
+            interrail_pass = self.flex.summary["transportDocument"][0]["ticket"][1]
             hd.update(b"interrail")
             if "referenceIA5" in interrail_pass:
                 hd.update(interrail_pass["referenceIA5"].encode("utf-8"))
@@ -177,7 +218,7 @@ class UICTicket:
             return base64.b32hexencode(hd.digest()).decode("utf-8")
 
         elif ticket_type == models.Ticket.TYPE_KLIMATICKET:
-            klimaticket_pass = self.flex.data["transportDocument"][0]["ticket"][1]
+            klimaticket_pass = self.flex.summary["transportDocument"][0]["ticket"][1]
             hd.update(b"klimaticket")
             if "referenceIA5" in klimaticket_pass:
                 hd.update(klimaticket_pass["referenceIA5"].encode("utf-8"))
@@ -227,16 +268,9 @@ class UICTicket:
             return False
 
 
-def parse_ticket_vdv(ticket_bytes: bytes, context: vdv.ticket.Context) -> VDVTicket:
-    pki_store = vdv.CertificateStore()
-    try:
-        pki_store.load_certificates()
-    except vdv.util.VDVException:
-        raise TicketError(
-            title="Internal error",
-            message="The PKI certificates could not be loaded. This is almost certainly a bug.",
-            exception=traceback.format_exc()
-        )
+def get_root_ca(pki_store: vdv.CertificateStore) -> vdv.CertificateData:
+    if root_ca_data := pki_store.find_verified_certificate(vdv.CAReference.root()):
+        return root_ca_data
 
     raw_root_ca = pki_store.find_certificate(vdv.CAReference.root())
     if not raw_root_ca:
@@ -285,17 +319,19 @@ def parse_ticket_vdv(ticket_bytes: bytes, context: vdv.ticket.Context) -> VDVTic
             exception=traceback.format_exc()
         )
 
-    try:
-        envelope = vdv.EnvelopeV2.parse(ticket_bytes)
-    except vdv.util.VDVException:
-        raise TicketError(
-            title="This doesn't look like a valid VDV ticket",
-            message="You may have scanned something that is not a VDV ticket, the ticket is corrupted, or there "
-                    "is a bug in this program.",
-            exception=traceback.format_exc()
-        )
+    pki_store.add_verified_certificate(root_ca_data)
+    return root_ca_data
 
-    raw_issuing_ca = pki_store.find_certificate(envelope.ca_reference)
+
+def get_issuing_ca(
+        pki_store: vdv.CertificateStore,
+        ca_reference: vdv.CAReference,
+        root_ca_data: vdv.CertificateData
+) -> vdv.CertificateData:
+    if issuing_ca_data := pki_store.find_verified_certificate(ca_reference):
+        return issuing_ca_data
+
+    raw_issuing_ca = pki_store.find_certificate(ca_reference)
     if not raw_issuing_ca:
         raise TicketError(
             title="Unknown issuing certificate",
@@ -345,12 +381,40 @@ def parse_ticket_vdv(ticket_bytes: bytes, context: vdv.ticket.Context) -> VDVTic
             message="The issuing CA isn't issued by the root CA - the ticket is likely invalid."
         )
 
-    if envelope.ca_reference != issuing_ca_data.certificate_holder_reference:
+    if ca_reference != issuing_ca_data.certificate_holder_reference:
         raise TicketError(
             title="Broken certificate chain",
             message="The ticket certificate isn't issued by the issuing CA - the ticket is likely invalid."
         )
 
+    pki_store.add_verified_certificate(issuing_ca_data)
+    return issuing_ca_data
+
+
+def parse_envelope_vdv(ticket_bytes: bytes) -> vdv.EnvelopeV2:
+    try:
+        return vdv.EnvelopeV2.parse(ticket_bytes)
+    except vdv.util.VDVLimitException:
+        raise TicketError(
+            title="Ticket too complex",
+            message="The ticket exceeds the limits of this program - the ticket is likely invalid.",
+            exception=traceback.format_exc()
+        )
+    except vdv.util.VDVException:
+        raise TicketError(
+            title="This doesn't look like a valid VDV ticket",
+            message="You may have scanned something that is not a VDV ticket, the ticket is corrupted, or there "
+                    "is a bug in this program.",
+            exception=traceback.format_exc()
+        )
+
+
+def decrypt_ticket_vdv(
+        envelope: vdv.EnvelopeV2,
+        context: vdv.ticket.Context,
+        root_ca_data: vdv.CertificateData,
+        issuing_ca_data: vdv.CertificateData
+) -> VDVTicket:
     if envelope.certificate.needs_ca_key():
         try:
             envelope.certificate.decrypt_with_ca_key(issuing_ca_data)
@@ -390,6 +454,12 @@ def parse_ticket_vdv(ticket_bytes: bytes, context: vdv.ticket.Context) -> VDVTic
 
     try:
         ticket = vdv.VDVTicket.parse(ticket_data, context)
+    except vdv.util.VDVLimitException:
+        raise TicketError(
+            title="Ticket too complex",
+            message="The ticket exceeds the limits of this program - the ticket is likely invalid.",
+            exception=traceback.format_exc()
+        )
     except vdv.util.VDVException:
         raise TicketError(
             title="Unable to parse ticket",
@@ -406,8 +476,121 @@ def parse_ticket_vdv(ticket_bytes: bytes, context: vdv.ticket.Context) -> VDVTic
     )
 
 
+def decrypt_ticket_vdv_result(args) -> typing.Union[VDVTicket, TicketError]:
+    try:
+        return decrypt_ticket_vdv(*args)
+    except TicketError as e:
+        return e
+
+
+VDV_PARALLEL_THRESHOLD = 16
+
+
+def vdv_parse_pool() -> typing.Optional[concurrent.futures.ProcessPoolExecutor]:
+    if settings.VDV_PARSE_WORKERS <= 1:
+        return None
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=settings.VDV_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup
+    )
+
+
+def parse_ticket_vdv(ticket_bytes: bytes, context: vdv.ticket.Context) -> VDVTicket:
+    pki_store = vdv.pki.get_certificate_store()
+    root_ca_data = get_root_ca(pki_store)
+    envelope = parse_envelope_vdv(ticket_bytes)
+    issuing_ca_data = get_issuing_ca(pki_store, envelope.ca_reference, root_ca_data)
+    return decrypt_ticket_vdv(envelope, context, root_ca_data, issuing_ca_data)
+
+
+def parse_tickets_vdv(
+        tickets_bytes: typing.Iterable[bytes],
+        context: vdv.ticket.Context,
+        pool: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+) -> typing.List[typing.Union[VDVTicket, TicketError]]:
+    results = []
+    groups = {}
+    for i, ticket_bytes in enumerate(tickets_bytes):
+        results.append(None)
+        try:
+            envelope = parse_envelope_vdv(ticket_bytes)
+        except TicketError as e:
+            results[i] = e
+            continue
+        groups.setdefault(envelope.ca_reference, []).append((i, envelope))
+
+    if not groups:
+        return results
+
+    pki_store = vdv.pki.get_certificate_store()
+    try:
+        root_ca_data = get_root_ca(pki_store)
+    except TicketError as e:
+        for items in groups.values():
+            for i, _ in items:
+                results[i] = e
+        return results
+
+    jobs = []
+    for ca_reference, items in groups.items():
+        try:
+            issuing_ca_data = get_issuing_ca(pki_store, ca_reference, root_ca_data)
+        except TicketError as e:
+            for i, _ in items:
+                results[i] = e
+            continue
+
+        for i, envelope in items:
+            jobs.append((i, (envelope, context, root_ca_data, issuing_ca_data)))
+
+    if pool and len(jobs) >= VDV_PARALLEL_THRESHOLD:
+        decoded = list(pool.map(
+            decrypt_ticket_vdv_result, (args for _, args in jobs),
+            chunksize=max(1, len(jobs) // (settings.VDV_PARSE_WORKERS * 4))
+        ))
+    else:
+        decoded = list(map(decrypt_ticket_vdv_result, (args for _, args in jobs)))
+
+    for (i, _), result in zip(jobs, decoded):
+        results[i] = result
+
+    return results
+
+
+@dataclasses.dataclass
+class PKIReport:
+    verified: typing.List[vdv.CertificateData]
+    failed: typing.List[typing.Tuple[vdv.CAReference, TicketError]]
+    expiring: typing.List[vdv.CertificateData]
+    next_expiry: typing.Optional[datetime.date]
+
+
+def warm_vdv_pki(expiry_warning: datetime.timedelta = datetime.timedelta(days=30)) -> PKIReport:
+    pki_store = vdv.pki.get_certificate_store()
+    if not pki_store.bundle:
+        pki_store.load_certificates()
+
+    root_ca_data = get_root_ca(pki_store)
+    verified = [root_ca_data]
+    failed = []
+    for ca_reference in sorted(pki_store.ca_references(), key=lambda c: c.to_bytes()):
+        if ca_reference == vdv.CAReference.root():
+            continue
+        try:
+            verified.append(get_issuing_ca(pki_store, ca_reference, root_ca_data))
+        except TicketError as e:
+            failed.append((ca_reference, e))
+
+    return PKIReport(
+        verified=verified,
+        failed=failed,
+        expiring=pki_store.expiring_before(datetime.date.today() + expiry_warning),
+        next_expiry=pki_store.next_expiry(),
+    )
+
+
 def parse_ticket_uic_head(ticket_envelope: uic.Envelope) -> typing.Optional[uic.HeadV1]:
-    head_record = next(filter(lambda r: r.id == "U_HEAD", ticket_envelope.records), None)
+    head_record = ticket_envelope.find("U_HEAD")
     if not head_record:
         return None
 
@@ -427,8 +610,30 @@ def parse_ticket_uic_head(ticket_envelope: uic.Envelope) -> typing.Optional[uic.
         )
 
 
+def parse_ticket_uic_record(ticket_envelope: uic.Envelope, record_id: str, version: int) -> typing.Any:
+    record = ticket_envelope.find(record_id, version)
+    if not record:
+        return None
+
+    record_type = uic.records.get_record_type(record_id, version)
+    try:
+        return record.parsed
+    except uic.util.UICLimitException:
+        raise TicketError(
+            title="Ticket too large",
+            message="The ticket exceeds the limits of this program - the ticket is likely invalid.",
+            exception=traceback.format_exc()
+        )
+    except record_type.exception:
+        raise TicketError(
+            title=f"Invalid {record_type.name} record",
+            message=f"The {record_type.name} record is invalid - the ticket is likely invalid.",
+            exception=traceback.format_exc()
+        )
+
+
 def parse_ticket_uic_layout(ticket_envelope: uic.Envelope) -> typing.Optional[uic.LayoutV1]:
-    layout_record = next(filter(lambda r: r.id == "U_TLAY", ticket_envelope.records), None)
+    layout_record = ticket_envelope.find("U_TLAY")
     if not layout_record:
         return None
 
@@ -438,22 +643,17 @@ def parse_ticket_uic_layout(ticket_envelope: uic.Envelope) -> typing.Optional[ui
             message=f"The layout record version {layout_record.version} is not supported."
         )
 
-    try:
-        return uic.LayoutV1.parse(layout_record.data)
-    except uic.util.UICException:
-        raise TicketError(
-            title="Invalid layout record",
-            message="The layout record is invalid - the ticket is likely invalid.",
-            exception=traceback.format_exc()
-        )
+    return parse_ticket_uic_record(ticket_envelope, "U_TLAY", 1)
 
 
-def parse_ticket_uic_flex(ticket_envelope: uic.Envelope) -> typing.Optional[uic.Flex]:
-    flex_record = next(filter(lambda r: r.id == "U_FLEX", ticket_envelope.records), None)
+def parse_ticket_uic_flex(ticket_envelope: uic.Envelope, summary: bool = False) -> typing.Optional[uic.Flex]:
+    flex_record = ticket_envelope.find("U_FLEX")
     if not flex_record:
         return None
 
     try:
+        if summary:
+            return uic.Flex.parse_summary(flex_record.version, flex_record.data)
         return uic.Flex.parse(flex_record.version, flex_record.data)
     except uic.util.UICException:
         raise TicketError(
@@ -464,53 +664,44 @@ def parse_ticket_uic_flex(ticket_envelope: uic.Envelope) -> typing.Optional[uic.
 
 
 def parse_ticket_uic_db_bl(ticket_envelope: uic.Envelope) -> typing.Optional[uic.db.DBRecordBL]:
-    bl_record = next(filter(lambda r: r.id == "0080BL" and r.version == 3, ticket_envelope.records), None)
-    if not bl_record:
-        return None
-
-    try:
-        return uic.db.DBRecordBL.parse(bl_record.data, bl_record.version)
-    except uic.db.DBException:
-        raise TicketError(
-            title="Invalid DB BL record",
-            message="The DB BL record is invalid - the ticket is likely invalid.",
-            exception=traceback.format_exc()
-        )
+    return parse_ticket_uic_record(ticket_envelope, "0080BL", 3)
 
 
 def parse_ticket_uic_cd_ut(ticket_envelope: uic.Envelope) -> typing.Optional[uic.cd.CDRecordUT]:
-    ut_record = next(filter(lambda r: r.id == "1154UT" and r.version == 1, ticket_envelope.records), None)
-    if not ut_record:
-        return None
-
-    try:
-        return uic.cd.CDRecordUT.parse(ut_record.data, ut_record.version)
-    except uic.cd.CDException:
-        raise TicketError(
-            title="Invalid CD UT record",
-            message="The CD UT record is invalid - the ticket is likely invalid.",
-            exception=traceback.format_exc()
-        )
+    return parse_ticket_uic_record(ticket_envelope, "1154UT", 1)
 
 
 def parse_ticket_uic_oebb_99(ticket_envelope: uic.Envelope) -> typing.Optional[uic.oebb.OeBBRecord99]:
-    oebb_record = next(filter(lambda r: r.id == "118199" and r.version == 1, ticket_envelope.records), None)
-    if not oebb_record:
-        return None
+    return parse_ticket_uic_record(ticket_envelope, "118199", 1)
 
-    try:
-        return uic.oebb.OeBBRecord99.parse(oebb_record.data, oebb_record.version)
-    except uic.oebb.OeBBException:
-        raise TicketError(
-            title="Invalid OeBB 99 record",
-            message="The OeBB 99 record is invalid - the ticket is likely invalid.",
-            exception=traceback.format_exc()
-        )
+
+def validate_ticket_uic_records(ticket_envelope: uic.Envelope):
+    parse_ticket_uic_layout(ticket_envelope)
+    for record in ticket_envelope.records:
+        if uic.records.get_record_type(record.id, record.version):
+            parse_ticket_uic_record(ticket_envelope, record.id, record.version)
+
+
+def uic_ticket_from_envelope(ticket_bytes: bytes, ticket_envelope: uic.Envelope, summary: bool = False) -> UICTicket:
+    return UICTicket(
+        raw_bytes=ticket_bytes,
+        envelope=ticket_envelope,
+        head=parse_ticket_uic_head(ticket_envelope),
+        flex=parse_ticket_uic_flex(ticket_envelope, summary),
+        other_records=[r for r in ticket_envelope.records if not (r.id.startswith("U_") or r.record_type)],
+        signature=uic.signature.verify(ticket_envelope, ticket_bytes),
+    )
 
 
-def parse_ticket_uic(ticket_bytes: bytes) -> UICTicket:
+def parse_ticket_uic(ticket_bytes: bytes, summary: bool = False) -> UICTicket:
     try:
         ticket_envelope = uic.Envelope.parse(ticket_bytes)
+    except uic.util.UICLimitException:
+        raise TicketError(
+            title="Ticket too large",
+            message="The ticket exceeds the limits of this program - the ticket is likely invalid.",
+            exception=traceback.format_exc()
+        )
     except uic.util.UICException:
         raise TicketError(
             title="This doesn't look like a valid UIC ticket",
@@ -519,28 +710,48 @@ def parse_ticket_uic(ticket_bytes: bytes) -> UICTicket:
             exception=traceback.format_exc()
         )
 
-    return UICTicket(
-        raw_bytes=ticket_bytes,
-        envelope=ticket_envelope,
-        head=parse_ticket_uic_head(ticket_envelope),
-        layout=parse_ticket_uic_layout(ticket_envelope),
-        flex=parse_ticket_uic_flex(ticket_envelope),
-        db_bl=parse_ticket_uic_db_bl(ticket_envelope),
-        cd_ut=parse_ticket_uic_cd_ut(ticket_envelope),
-        oebb_99=parse_ticket_uic_oebb_99(ticket_envelope),
-        other_records=[r for r in ticket_envelope.records if not (
-                r.id.startswith("U_") or r.id == "0080BL" or r.id == "1154UT" or r.id == "118199"
-        )]
+    ticket_data = uic_ticket_from_envelope(ticket_bytes, ticket_envelope, summary)
+    validate_ticket_uic_records(ticket_envelope)
+    return ticket_data
+
+
+def vdv_context(account: typing.Optional["models.Account"]) -> vdv.ticket.Context:
+    return vdv.ticket.Context(
+        account_forename=account.user.first_name if account else None,
+        account_surname=account.user.last_name if account else None,
     )
 
-def parse_ticket(ticket_bytes: bytes, account: typing.Optional["models.Account"]) -> typing.Union[VDVTicket, UICTicket]:
+
+def parse_ticket(
+        ticket_bytes: bytes, account: typing.Optional["models.Account"], summary: bool = False
+) -> typing.Union[VDVTicket, UICTicket]:
     if ticket_bytes[:3] == b"#UT":
-        return parse_ticket_uic(ticket_bytes)
+        return parse_ticket_uic(ticket_bytes, summary)
     else:
-        return parse_ticket_vdv(ticket_bytes, vdv.ticket.Context(
-            account_forename=account.user.first_name if account else None,
-            account_surname=account.user.last_name if account else None,
-        ))
+        return parse_ticket_vdv(ticket_bytes, vdv_context(account))
+
+
+def parse_tickets(
+        tickets_bytes: typing.Sequence[bytes], account: typing.Optional["models.Account"], summary: bool = False,
+        pool: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+) -> typing.List[typing.Union[VDVTicket, UICTicket, TicketError]]:
+    results = [None] * len(tickets_bytes)
+    vdv_items = []
+    for i, ticket_bytes in enumerate(tickets_bytes):
+        if ticket_bytes[:3] == b"#UT":
+            try:
+                results[i] = parse_ticket_uic(ticket_bytes, summary)
+            except TicketError as e:
+                results[i] = e
+        else:
+            vdv_items.append((i, ticket_bytes))
+
+    if vdv_items:
+        decoded = parse_tickets_vdv((ticket_bytes for _, ticket_bytes in vdv_items), vdv_context(account), pool)
+        for (i, _), result in zip(vdv_items, decoded):
+            results[i] = result
+
+    return results
 
 
 def to_dict_json(elements: typing.List[typing.Tuple[str, typing.Any]]) -> dict:
@@ -553,6 +764,64 @@ def to_dict_json(elements: typing.List[typing.Tuple[str, typing.Any]]) -> dict:
     return {k: encode_value(v) for k, v in elements}
 
 
+def traveller_hash(forename: typing.Optional[str], surname: typing.Optional[str]) -> typing.Optional[str]:
+    if not forename and not surname:
+        return None
+    name = f"{(forename or '').strip().casefold()}\n{(surname or '').strip().casefold()}"
+    return salted_hmac("main.ticket.traveller_hash", name, algorithm="sha256").hexdigest()
+
+
+UIC_INSTANCE_COLUMNS = (
+    "ticket_kind", "from_station_code", "to_station_code", "product_id", "traveller_hash", "class_code"
+)
+UIC_TICKET_KIND_UNKNOWN = "unknown"
+
+
+def uic_station_code(code: typing.Optional[int], code_table: str) -> typing.Optional[int]:
+    if code is None:
+        return None
+    if code_table == "stationUIC":
+        return code
+    if code_table == "db" and (station := uic.stations.get_station_by_db(code)) and station.get("uic"):
+        return int(station["uic"])
+    return None
+
+
+def uic_instance_columns(ticket_data: UICTicket) -> dict:
+    columns = dict.fromkeys(UIC_INSTANCE_COLUMNS)
+    columns["ticket_kind"] = UIC_TICKET_KIND_UNKNOWN
+
+    if ticket_data.flex:
+        documents = ticket_data.flex.summary.get("transportDocument", [])
+        if documents:
+            document_type, document = documents[0]["ticket"]
+            product_id = document.get("productIdNum", document.get("productIdIA5"))
+            columns["ticket_kind"] = document_type
+            code_table = document.get("stationCodeTable", "stationUIC")
+            columns["from_station_code"] = uic_station_code(document.get("fromStationNum"), code_table)
+            columns["to_station_code"] = uic_station_code(document.get("toStationNum"), code_table)
+            columns["product_id"] = str(product_id)[:64] if product_id is not None else None
+            columns["class_code"] = document.get("classCode")
+
+        travellers = ticket_data.flex.summary.get("travelerDetail", {}).get("traveler", [])
+        if travellers:
+            columns["traveller_hash"] = traveller_hash(travellers[0].get("firstName"), travellers[0].get("lastName"))
+    elif ticket_data.db_bl:
+        columns["ticket_kind"] = "0080BL"
+        columns["from_station_code"] = uic_station_code(ticket_data.db_bl.from_station_uic, "db")
+        columns["to_station_code"] = uic_station_code(ticket_data.db_bl.to_station_uic, "db")
+        columns["product_id"] = ticket_data.db_bl.product[:64] if ticket_data.db_bl.product else None
+        columns["traveller_hash"] = traveller_hash(
+            ticket_data.db_bl.traveller_forename, ticket_data.db_bl.traveller_surname
+        )
+    elif ticket_data.cd_ut:
+        columns["ticket_kind"] = "1154UT"
+    elif ticket_data.oebb_99:
+        columns["ticket_kind"] = "118199"
+
+    return columns
+
+
 def create_ticket_obj(
         ticket_obj: "models.Ticket",
         ticket_bytes: bytes,
@@ -581,7 +850,7 @@ def create_ticket_obj(
         validity_start = None
         validity_end = None
         if ticket_data.flex:
-            docs = ticket_data.flex.data.get("transportDocument")
+            docs = ticket_data.flex.summary.get("transportDocument")
             if docs:
                 if docs[0]["ticket"][0] == "openTicket":
                     validity_start = templatetags.rics.rics_valid_from(docs[0]["ticket"][1], ticket_data.issuing_time())
@@ -601,14 +870,39 @@ def create_ticket_obj(
                 "validity_end": validity_end,
                 "decoded_data": {
                     "envelope": dataclasses.asdict(ticket_data.envelope, dict_factory=to_dict_json),
-                }
+                },
+                **uic_instance_columns(ticket_data),
             }
         )
     return created
 
 def update_from_subscription_barcode(barcode_data: bytes, account: typing.Optional["models.Account"]) -> "models.Ticket":
-    decoded_ticket = parse_ticket(barcode_data, account=account)
+    decoded_ticket = parse_ticket(barcode_data, account=account, summary=True)
+    return store_subscription_ticket(barcode_data, decoded_ticket, account)
+
+
+def update_from_subscription_barcodes(
+        barcodes: typing.Sequence[bytes], account: typing.Optional["models.Account"],
+        pool: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+) -> typing.List[typing.Union["models.Ticket", TicketError]]:
+    results = []
+    decoded_tickets = parse_tickets(barcodes, account=account, summary=True, pool=pool)
+    for barcode_data, decoded_ticket in zip(barcodes, decoded_tickets):
+        if isinstance(decoded_ticket, TicketError):
+            results.append(decoded_ticket)
+            continue
+        try:
+            results.append(store_subscription_ticket(barcode_data, decoded_ticket, account))
+        except TicketError as e:
+            results.append(e)
+    return results
+
 
+def store_subscription_ticket(
+        barcode_data: bytes,
+        decoded_ticket: typing.Union[VDVTicket, UICTicket],
+        account: typing.Optional["models.Account"]
+) -> "models.Ticket":
     should_update = False
     ticket_pk = decoded_ticket.pk()
     ticket_obj = models.Ticket.objects.filter(pk=ticket_pk).first()
@@ -3,4 +3,4 @@ from .envelope import Envelope
 from .head import HeadV1
 from .layout import LayoutV1
 from .flex import Flex
-from . import rics, stations, db, cd, oebb
\ No newline at end of file
+from . import records, rics, stations, station_names, signature, db, cd, oebb
\ No newline at end of file
@@ -3,11 +3,13 @@ import typing
 import datetime
 
 import pytz
+from . import records
 
 
 class CDException(Exception):
     pass
 
+@records.register("1154UT", 1, "CD UT", CDException, "main/uic/cd.html")
 @dataclasses.dataclass
 class CDRecordUT:
     name: typing.Optional[str]
@@ -27,35 +29,21 @@ class CDRecordUT:
         validity_end = None
         blocks = {}
 
-        offset = 0
-        while data[offset:]:
-            try:
-                block_id = data[offset:offset + 2].decode("utf-8")
-            except UnicodeDecodeError as e:
-                raise CDException(f"Invalid CD UT record") from e
-            try:
-                block_len = int(data[offset + 2:offset + 5].decode("utf-8"), 10)
-            except (ValueError, UnicodeDecodeError) as e:
-                raise CDException(f"Invalid CD UT record") from e
-            try:
-                block_data = data[offset + 5:offset + 5 + block_len].decode("utf-8")
-            except UnicodeDecodeError as e:
-                raise CDException(f"Invalid CD UT record") from e
-            offset += 5 + block_len
-
+        scanner = records.FieldScanner(data, CDException)
+        for block_id, block_data in scanner.blocks(2, 3, "Invalid CD UT record"):
             if block_id == "KJ":
                 name = block_data
             elif block_id == "OD":
                 try:
                     validity_start = tz.localize(
-                        datetime.datetime.strptime(block_data, "%d.%m.%Y %H:%M")
+                        records.parse_datetime(block_data)
                     ).astimezone(pytz.utc)
                 except ValueError as e:
                     raise CDException(f"Invalid validity start date") from e
             elif block_id == "DO":
                 try:
                     validity_end = tz.localize(
-                        datetime.datetime.strptime(block_data, "%d.%m.%Y %H:%M")
+                        records.parse_datetime(block_data)
                     ).astimezone(pytz.utc)
                 except ValueError as e:
                     raise CDException(f"Invalid validity end date") from e
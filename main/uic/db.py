@@ -1,10 +1,12 @@
 import dataclasses
 import typing
 import datetime
+from . import records
 
 class DBException(Exception):
     pass
 
+@records.register("0080BL", 3, "DB BL", DBException, "main/uic/db.html")
 @dataclasses.dataclass
 class DBRecordBL:
     unknown: str
@@ -26,26 +28,12 @@ class DBRecordBL:
         if version != 3:
             raise DBException(f"Unsupported record version {version}")
 
-        try:
-            unknown_data = data[0:2].decode("utf-8")
-        except UnicodeDecodeError as e:
-            raise DBException(f"Invalid DB BL record") from e
-        try:
-            num_cert_blocks = int(data[2:3].decode("utf-8"), 10)
-        except (ValueError, UnicodeDecodeError) as e:
-            raise DBException(f"Invalid DB BL record") from e
-
-        offset = 3
-        certs = []
-        for _ in range(num_cert_blocks):
-            certs.append(DBCertBlock(data[offset:offset+26]))
-            offset += 26
-
-        try:
-            num_sub_blocks = int(data[offset:offset+2].decode("utf-8"), 10)
-        except (ValueError, UnicodeDecodeError) as e:
-            raise DBException(f"Invalid DB BL record") from e
-        offset += 2
+        scanner = records.FieldScanner(data, DBException)
+        unknown_data = scanner.read_str(2, "Invalid DB BL record", "utf-8")
+        num_cert_blocks = scanner.read_int(1, "Invalid DB BL record")
+        certs = [DBCertBlock(bytes(scanner.take(26, "Invalid DB BL record", partial=True)))
+                 for _ in range(num_cert_blocks)]
+        num_sub_blocks = scanner.read_int(2, "Invalid DB BL record")
 
         blocks = {}
         product = None
@@ -58,21 +46,7 @@ class DBRecordBL:
         validity_end = None
         traveller_forename = None
         traveller_surname = None
-        for _ in range(num_sub_blocks):
-            try:
-                block_id = data[offset:offset+4].decode("utf-8")
-            except UnicodeDecodeError as e:
-                raise DBException(f"Invalid DB BL record") from e
-            try:
-                block_len = int(data[offset+4:offset+8].decode("utf-8"), 10)
-            except (ValueError, UnicodeDecodeError) as e:
-                raise DBException(f"Invalid DB BL record") from e
-            try:
-                block_data = data[offset+8:offset+8+block_len].decode("utf-8")
-            except UnicodeDecodeError as e:
-                raise DBException(f"Invalid DB BL record") from e
-            offset += block_len + 8
-
+        for block_id, block_data in scanner.blocks(4, 4, "Invalid DB BL record", num_sub_blocks):
             if block_id == "S001":
                 product = block_data
             elif block_id == "S015":
@@ -97,18 +71,17 @@ class DBRecordBL:
                 traveller_forename, traveller_surname = block_data.split("#", 1)
             elif block_id == "S031":
                 try:
-                    validity_start = datetime.datetime.strptime(block_data, "%d.%m.%Y").date()
+                    validity_start = records.parse_date(block_data)
                 except ValueError as e:
                     raise DBException(f"Invalid validity start date") from e
             elif block_id == "S032":
                 try:
-                    validity_end = datetime.datetime.strptime(block_data, "%d.%m.%Y").date()
+                    validity_end = records.parse_date(block_data)
                 except ValueError as e:
                     raise DBException(f"Invalid validity end date") from e
             else:
                 blocks[block_id] = block_data
 
-
         return cls(
             unknown=unknown_data,
             certs=certs,
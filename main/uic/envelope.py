@@ -1,8 +1,10 @@
 import dataclasses
+import functools
 import typing
 import zlib
+from django.conf import settings
 
-from . import util, rics
+from . import util, rics, records
 
 
 @dataclasses.dataclass
@@ -14,36 +16,76 @@ class Record:
     def data_hex(self):
         return ":".join(f"{b:02x}" for b in self.data)
 
+    @property
+    def record_type(self) -> typing.Optional[records.RecordType]:
+        return records.get_record_type(self.id, self.version)
+
+    @functools.cached_property
+    def parsed(self) -> typing.Any:
+        if record_type := self.record_type:
+            return record_type.parse(self.data)
+        return None
+
     @classmethod
     def parse(cls, data: bytes) -> "Record":
-        if len(data) < 12:
+        return cls.parse_at(memoryview(data), 0)[0]
+
+    @classmethod
+    def parse_at(cls, data: memoryview, offset: int) -> typing.Tuple["Record", int]:
+        if len(data) - offset < 12:
             raise util.UICException("UIC ticket record too short")
 
         try:
-            record_id = data[0:6].decode("ascii")
+            record_id = str(data[offset:offset + 6], "ascii")
         except UnicodeDecodeError as e:
             raise util.UICException("Invalid UIC ticket record ID") from e
 
         try:
-            version_str = data[6:8].decode("ascii")
+            version_str = str(data[offset + 6:offset + 8], "ascii")
             version = int(version_str, 10)
         except (UnicodeDecodeError, ValueError) as e:
             raise util.UICException("Invalid UIC ticket record version") from e
 
         try:
-            data_length_str = data[8:12].decode("ascii")
+            data_length_str = str(data[offset + 8:offset + 12], "ascii")
             data_length = int(data_length_str, 10)
         except (UnicodeDecodeError, ValueError) as e:
             raise util.UICException("Invalid UIC ticket record data length") from e
 
-        if len(data) < data_length:
+        if len(data) - offset < data_length:
             raise util.UICException("UIC ticket record data too short")
 
+        record_data = bytes(data[offset + 12:offset + data_length])
         return cls(
             id=record_id,
             version=version,
-            data=data[12:data_length]
-        )
+            data=record_data
+        ), offset + 12 + len(record_data)
+
+
+def iter_records(data: typing.Union[bytes, memoryview]) -> typing.Iterator[Record]:
+    data = memoryview(data)
+    offset = 0
+    count = 0
+    while offset < len(data):
+        count += 1
+        if count > settings.UIC_MAX_RECORDS:
+            raise util.UICLimitException("Too many UIC ticket records")
+        record, offset = Record.parse_at(data, offset)
+        yield record
+
+
+def decompress(data: bytes, max_size: int) -> bytes:
+    decompressor = zlib.decompressobj()
+    try:
+        raw_data = decompressor.decompress(data, max_size + 1)
+    except zlib.error as e:
+        raise util.UICException("Failed to decompress UIC ticket data") from e
+    if len(raw_data) > max_size:
+        raise util.UICLimitException("UIC ticket data too large")
+    if not decompressor.eof:
+        raise util.UICException("Failed to decompress UIC ticket data")
+    return raw_data
 
 
 @dataclasses.dataclass
@@ -54,9 +96,23 @@ class Envelope:
     signature: bytes
     records: typing.List[Record]
 
+    def __post_init__(self):
+        self.index = {}
+        for record in self.records:
+            self.index.setdefault((record.id, record.version), record)
+            self.index.setdefault((record.id, None), record)
+
+    def find(self, record_id: str, version: typing.Optional[int] = None) -> typing.Optional[Record]:
+        return self.index.get((record_id, version))
+
     def issuer(self):
         return rics.get_rics(self.issuer_rics)
 
+    def signed_data(self, barcode: bytes) -> bytes:
+        offset = 64 if self.version == 1 else 78
+        data_length = int(bytes(barcode[offset:offset + 4]).decode("ascii"), 10)
+        return bytes(barcode[offset + 4:offset + 4 + data_length])
+
     @classmethod
     def parse(cls, data: bytes) -> "Envelope":
         if data[:3] != b"#UT":
@@ -102,22 +158,12 @@ class Envelope:
         if len(data) < 4 + data_length:
             raise util.UICException("UIC ticket data too short")
 
-        try:
-            raw_ticket = zlib.decompress(data[4:4+data_length])
-        except zlib.error as e:
-            raise util.UICException("Failed to decompress UIC ticket data") from e
-
-        offset = 0
-        records = []
-        while raw_ticket[offset:]:
-            record = Record.parse(raw_ticket[offset:])
-            offset += 12 + len(record.data)
-            records.append(record)
+        raw_ticket = decompress(data[4:4+data_length], settings.UIC_MAX_DECOMPRESSED_SIZE)
 
         return cls(
             version=version,
             issuer_rics=provider,
             signature_key_id=signature_key_id,
             signature=signature,
-            records=records
+            records=list(iter_records(raw_ticket))
         )
\ No newline at end of file
@@ -1,64 +1,260 @@
 import typing
+import collections
 import dataclasses
+import hashlib
+import logging
+import os
 import pathlib
+import pickle
 import datetime
+import tempfile
+import threading
 import asn1tools
+import asn1tools.codecs.uper
 import pytz
+import django.core.cache
+from django.conf import settings
 from . import util
 
+logger = logging.getLogger(__name__)
+
 ROOT = pathlib.Path(__file__).parent
-ASN1_SPEC_V1_3 = asn1tools.compile_files([ROOT / "asn1" / "uicRailTicketData_v1.3.4.asn"], codec="uper")
-ASN1_SPEC_V2 = asn1tools.compile_files([ROOT / "asn1" / "uicRailTicketData_v2.0.2.asn"], codec="uper")
-ASN1_SPEC_V3 = asn1tools.compile_files([ROOT / "asn1" / "uicRailTicketData_v3.0.3.asn"], codec="uper")
+CACHE_DIR = pathlib.Path(os.getenv("ASN1_CACHE_DIR", ROOT / "asn1" / "cache"))
+SPEC_FILES = {
+    13: ROOT / "asn1" / "uicRailTicketData_v1.3.4.asn",
+    2: ROOT / "asn1" / "uicRailTicketData_v2.0.2.asn",
+    3: ROOT / "asn1" / "uicRailTicketData_v3.0.3.asn",
+}
+SPECS = {}
+SPECS_LOCK = threading.Lock()
+SUMMARY_MEMBERS = ("issuingDetail", "travelerDetail", "transportDocument")
+
+
+def spec_cache_path(spec_file: pathlib.Path) -> pathlib.Path:
+    spec_hash = hashlib.sha256(spec_file.read_bytes()).hexdigest()[:16]
+    return CACHE_DIR / f"{spec_file.stem}-{asn1tools.__version__}-{spec_hash}.pickle"
+
+
+def compile_spec(spec_file: pathlib.Path) -> asn1tools.compiler.Specification:
+    cache_path = spec_cache_path(spec_file)
+    try:
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("Unable to load cached ASN.1 spec %s: %s", cache_path, e)
+
+    spec = asn1tools.compile_files([spec_file], codec="uper")
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=CACHE_DIR, delete=False) as f:
+            pickle.dump(spec, f)
+        os.replace(f.name, cache_path)
+    except OSError as e:
+        logger.warning("Unable to cache ASN.1 spec %s: %s", cache_path, e)
+    return spec
+
+
+def build_cache():
+    for spec_file in SPEC_FILES.values():
+        compile_spec(spec_file)
+        print(f"Compiled {spec_file.name} to {spec_cache_path(spec_file)}")
+
+
+def get_spec(version: int) -> asn1tools.compiler.Specification:
+    if spec := SPECS.get(version):
+        return spec
+
+    if version not in SPEC_FILES:
+        raise util.UICException("Unsupported UIC rail ticket flexible data version")
+
+    with SPECS_LOCK:
+        if version not in SPECS:
+            SPECS[version] = compile_spec(SPEC_FILES[version])
+        return SPECS[version]
+
+
+@dataclasses.dataclass(frozen=True)
+class DecodeCacheStats:
+    size: int
+    max_size: int
+    hits: int
+    shared_hits: int
+    misses: int
+    evictions: int
+
+
+class DecodeCache:
+    def __init__(self):
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(version: int, data: bytes, summary: bool = False) -> str:
+        return f"uic-flex{'-summary' if summary else ''}:{version}:{hashlib.sha256(data).hexdigest()}"
+
+    @staticmethod
+    def shared_cache() -> typing.Optional[django.core.cache.BaseCache]:
+        if settings.UIC_FLEX_CACHE_ALIAS:
+            return django.core.cache.caches[settings.UIC_FLEX_CACHE_ALIAS]
+        return None
+
+    def store(self, key: str, value: bytes):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.UIC_FLEX_CACHE_SIZE:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key: str) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+
+        if value is None and (shared_cache := self.shared_cache()):
+            value = shared_cache.get(key)
+            if value is not None:
+                self.store(key, value)
+                with self.lock:
+                    self.shared_hits += 1
+
+        if value is None:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        return pickle.loads(value)
+
+    def set(self, key: str, data: typing.Dict[str, typing.Any]):
+        value = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        self.store(key, value)
+        if shared_cache := self.shared_cache():
+            shared_cache.set(key, value, timeout=None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> DecodeCacheStats:
+        with self.lock:
+            return DecodeCacheStats(
+                size=len(self.entries),
+                max_size=settings.UIC_FLEX_CACHE_SIZE,
+                hits=self.hits,
+                shared_hits=self.shared_hits,
+                misses=self.misses,
+                evictions=self.evictions,
+            )
+
+
+DECODE_CACHE = DecodeCache()
+
+
+def decode_first_element(array_type, decoder: asn1tools.codecs.uper.Decoder) -> typing.List[typing.Any]:
+    if array_type.has_extension_marker and decoder.read_bit():
+        length = decoder.read_length_determinant()
+    elif array_type.number_of_bits is None:
+        decoder.align()
+        length = decoder.read_length_determinant()
+    else:
+        length = array_type.minimum
+        if array_type.minimum != array_type.maximum:
+            length += decoder.read_non_negative_binary_integer(array_type.number_of_bits)
+
+    return [array_type.element_type.decode(decoder)] if length else []
+
+
+def decode_summary(spec: asn1tools.compiler.Specification, data: bytes) -> typing.Dict[str, typing.Any]:
+    root = spec.types["UicRailTicketData"].type
+    decoder = asn1tools.codecs.uper.Decoder(bytearray(data))
+    if root.additions is not None:
+        decoder.read_bit()
+    present = {member: decoder.read_bit() for member in root.optionals}
+
+    values = {}
+    for member in root.root_members:
+        if member.name not in SUMMARY_MEMBERS:
+            break
+        if not present.get(member, True):
+            if member.has_default():
+                values[member.name] = member.default
+            continue
+        if member.name == "transportDocument":
+            values[member.name] = decode_first_element(member, decoder)
+        else:
+            values[member.name] = member.decode(decoder)
+
+    return values
+
 
 @dataclasses.dataclass
 class Flex:
     version: int
-    data: typing.Dict[str, typing.Any]
+    raw: bytes = dataclasses.field(repr=False)
+    summary: typing.Dict[str, typing.Any] = dataclasses.field(repr=False)
+    full: typing.Optional[typing.Dict[str, typing.Any]] = dataclasses.field(default=None, repr=False)
 
     @classmethod
-    def parse(cls, version: int, data: bytes) -> "Flex":
+    def decode(cls, version: int, data: bytes, summary: bool) -> typing.Dict[str, typing.Any]:
+        cache_key = DECODE_CACHE.key(version, data, summary)
+        if (decoded := DECODE_CACHE.get(cache_key)) is not None:
+            return decoded
+
+        spec = get_spec(version)
         try:
-            if version == 13:
-                return cls(
-                    version=version,
-                    data=ASN1_SPEC_V1_3.decode("UicRailTicketData", data)
-                )
-            elif version == 2:
-                return cls(
-                    version=version,
-                    data=ASN1_SPEC_V2.decode("UicRailTicketData", data)
-                )
-            elif version == 3:
-                return cls(
-                    version=version,
-                    data=ASN1_SPEC_V3.decode("UicRailTicketData", data)
-                )
+            if summary:
+                decoded = decode_summary(spec, data)
             else:
-                raise util.UICException("Unsupported UIC rail ticket flexible data version")
+                decoded = spec.decode("UicRailTicketData", data)
         except asn1tools.DecodeError as e:
             raise util.UICException("Failed to decode UIC rail ticket flexible data") from e
 
+        DECODE_CACHE.set(cache_key, decoded)
+        return decoded
+
+    @classmethod
+    def parse(cls, version: int, data: bytes) -> "Flex":
+        flex_data = cls.decode(version, data, False)
+        return cls(version=version, raw=data, summary=flex_data, full=flex_data)
+
+    @classmethod
+    def parse_summary(cls, version: int, data: bytes) -> "Flex":
+        return cls(version=version, raw=data, summary=cls.decode(version, data, True))
+
+    @property
+    def data(self) -> typing.Dict[str, typing.Any]:
+        if self.full is None:
+            self.full = self.decode(self.version, self.raw, False)
+        return self.full
+
     def issuing_rics(self) -> int:
         if self.version in (13, 2, 3):
-            rics = self.data["issuingDetail"].get("issuerNum", 0)
+            rics = self.summary["issuingDetail"].get("issuerNum", 0)
             if rics:
                 return rics
             else:
-                return self.data["issuingDetail"].get("securityProviderNum", 0)
+                return self.summary["issuingDetail"].get("securityProviderNum", 0)
 
     def ticket_id(self) -> str:
         if self.version in (13, 2, 3):
-            return self.data["issuingDetail"].get("issuerPNR", "")
+            return self.summary["issuingDetail"].get("issuerPNR", "")
 
     def issuing_time(self) -> typing.Optional[datetime.datetime]:
         if self.version in (13, 2, 3):
-            date = datetime.datetime(self.data["issuingDetail"]["issuingYear"], 1, 1)
-            date += datetime.timedelta(days=self.data["issuingDetail"]["issuingDay"] - 1)
-            if "issuingTime" in self.data["issuingDetail"]:
-                date += datetime.timedelta(minutes=self.data["issuingDetail"]["issuingTime"])
+            date = datetime.datetime(self.summary["issuingDetail"]["issuingYear"], 1, 1)
+            date += datetime.timedelta(days=self.summary["issuingDetail"]["issuingDay"] - 1)
+            if "issuingTime" in self.summary["issuingDetail"]:
+                date += datetime.timedelta(minutes=self.summary["issuingDetail"]["issuingTime"])
             return pytz.utc.localize(date)
 
     def specimen(self) -> bool:
         if self.version in (13, 2, 3):
-            return self.data["issuingDetail"]["specimen"]
\ No newline at end of file
+            return self.summary["issuingDetail"]["specimen"]
\ No newline at end of file
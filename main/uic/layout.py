@@ -1,7 +1,11 @@
 import dataclasses
 import typing
+from django.conf import settings
 
-from . import util
+from . import util, records
+
+# line, column, height, width, formatting, text length
+FIELD_HEADER = records.FixedFields(2, 2, 2, 2, 1, 4)
 
 class LayoutV1FieldFormatting:
     def __init__(self, formatting: int):
@@ -35,78 +39,47 @@ class LayoutV1Field:
     formatting: LayoutV1FieldFormatting
     text: str
 
+@records.register("U_TLAY", 1, "layout", template="main/uic/paper.html")
 @dataclasses.dataclass
 class LayoutV1:
     standard: str
     fields: typing.List[LayoutV1Field]
 
     @classmethod
-    def parse(cls, data: bytes) -> "LayoutV1":
+    def parse(cls, data: bytes, version: int = 1) -> "LayoutV1":
         if len(data) < 8:
             raise util.UICException("UIC ticket layout too short")
 
-        try:
-            standard = data[0:4].decode("ascii")
-        except UnicodeDecodeError as e:
-            raise util.UICException("Invalid UIC ticket layout standard") from e
-
-        try:
-            field_count_str = data[4:8].decode("ascii")
-            field_count = int(field_count_str, 10)
-        except (UnicodeDecodeError, ValueError) as e:
-            raise util.UICException("Invalid UIC ticket layout field count") from e
+        scanner = records.FieldScanner(data)
+        standard = scanner.read_str(4, "Invalid UIC ticket layout standard")
+        field_count = scanner.read_int(4, "Invalid UIC ticket layout field count")
+        if field_count > settings.UIC_MAX_LAYOUT_FIELDS:
+            raise util.UICLimitException("Too many UIC ticket layout fields")
 
         fields = []
-        offset = 8
         for _ in range(field_count):
-            if len(data) < offset + 13:
+            if scanner.remaining() < 13:
                 raise util.UICException("UIC ticket layout field too short")
 
-            try:
-                field_line_str = data[offset:offset + 2].decode("ascii")
-                field_line = int(field_line_str, 10)
-                field_column_str = data[offset + 2:offset + 4].decode("ascii")
-                field_column = int(field_column_str, 10)
-                field_height_str = data[offset + 4:offset + 6].decode("ascii")
-                field_height = int(field_height_str, 10)
-                field_width_str = data[offset + 6:offset + 8].decode("ascii")
-                field_width = int(field_width_str, 10)
-            except (UnicodeDecodeError, ValueError) as e:
-                raise util.UICException("Invalid UIC ticket layout field position") from e
-
-            try:
-                field_formatting_str = data[offset + 8:offset + 9].decode("ascii")
-                field_formatting = LayoutV1FieldFormatting(int(field_formatting_str, 10))
-            except (UnicodeDecodeError, ValueError) as e:
-                raise util.UICException("Invalid UIC ticket layout field formatting") from e
-
-            try:
-                field_text_length_str = data[offset + 9:offset + 13].decode("ascii")
-                field_text_length = int(field_text_length_str, 10)
-            except (UnicodeDecodeError, ValueError) as e:
-                raise util.UICException("Invalid UIC ticket layout field text length") from e
-
-            if len(data) < offset + 13 + field_text_length:
-                raise util.UICException("UIC ticket layout field text too short")
+            field_line, field_column, field_height, field_width, field_formatting, field_text_length = \
+                scanner.read_ints(FIELD_HEADER, "Invalid UIC ticket layout field header")
 
-            try:
-                field_text = data[offset + 13:offset + 13 + field_text_length].decode("utf-8")\
-                    .replace("\\n", "\n")
-            except UnicodeDecodeError as e:
-                raise util.UICException("Invalid UIC ticket layout field text") from e
+            if scanner.remaining() < field_text_length:
+                raise util.UICException("UIC ticket layout field text too short")
 
-            offset += 13 + field_text_length
+            field_text = scanner.read_str(field_text_length, "Invalid UIC ticket layout field text", "utf-8")\
+                .replace("\\n", "\n")
 
             fields.append(LayoutV1Field(
                 line=field_line,
                 column=field_column,
                 height=field_height,
                 width=field_width,
-                formatting=field_formatting,
+                formatting=LayoutV1FieldFormatting(field_formatting),
                 text=field_text
             ))
 
         return cls(
             standard=standard,
             fields=fields
-        )
\ No newline at end of file
+        )
@@ -3,11 +3,13 @@ import typing
 import datetime
 import json
 import pytz
+from . import records
 
 
 class OeBBException(Exception):
     pass
 
+@records.register("118199", 1, "OeBB 99", OeBBException, "main/uic/oebb.html")
 @dataclasses.dataclass
 class OeBBRecord99:
     validity_start: datetime.datetime
@@ -0,0 +1,138 @@
+import dataclasses
+import datetime
+import re
+import typing
+from . import util
+
+Buffer = typing.Union[bytes, bytearray, memoryview]
+
+
+@dataclasses.dataclass(frozen=True)
+class RecordType:
+    record_id: str
+    version: int
+    name: str
+    parser: typing.Callable[[bytes, int], typing.Any]
+    exception: typing.Type[Exception]
+    template: typing.Optional[str] = None
+
+    def parse(self, data: bytes) -> typing.Any:
+        return self.parser(data, self.version)
+
+
+RECORD_TYPES: typing.Dict[typing.Tuple[str, int], RecordType] = {}
+
+
+def register(
+        record_id: str, version: int, name: str, exception: typing.Type[Exception] = util.UICException,
+        template: typing.Optional[str] = None
+):
+    def decorator(cls):
+        RECORD_TYPES[(record_id, version)] = RecordType(
+            record_id=record_id,
+            version=version,
+            name=name,
+            parser=cls.parse,
+            exception=exception,
+            template=template,
+        )
+        return cls
+
+    return decorator
+
+
+def get_record_type(record_id: str, version: int) -> typing.Optional[RecordType]:
+    return RECORD_TYPES.get((record_id, version))
+
+
+class FixedFields:
+    def __init__(self, *widths: int):
+        self.widths = widths
+        self.size = sum(widths)
+        self.pattern = re.compile(b"".join(b"([ 0-9]{%d})" % width for width in widths))
+
+
+class FieldScanner:
+    __slots__ = ("data", "offset", "end", "exception")
+
+    def __init__(self, data: Buffer, exception: typing.Type[Exception] = util.UICException):
+        self.data = data
+        self.offset = 0
+        self.end = len(data)
+        self.exception = exception
+
+    def remaining(self) -> int:
+        return self.end - self.offset
+
+    def take(self, length: int, message: str, partial: bool = False) -> Buffer:
+        offset = self.offset
+        end = offset + length
+        if end > self.end:
+            if not partial:
+                raise self.exception(message)
+            end = self.end
+        elif length < 0:
+            raise self.exception(message)
+        self.offset = end
+        return self.data[offset:end]
+
+    def read_str(self, length: int, message: str, encoding: str = "ascii", partial: bool = False) -> str:
+        try:
+            return str(self.take(length, message, partial), encoding)
+        except UnicodeDecodeError as e:
+            raise self.exception(message) from e
+
+    def read_ints(self, fields: FixedFields, message: str) -> typing.Tuple[int, ...]:
+        if not (match := fields.pattern.match(self.data, self.offset)):
+            raise self.exception(message)
+        try:
+            values = tuple(map(int, match.groups()))
+        except ValueError as e:
+            raise self.exception(message) from e
+        self.offset += fields.size
+        return values
+
+    def read_int(self, length: int, message: str) -> int:
+        try:
+            return int(str(self.take(length, message), "ascii"), 10)
+        except ValueError as e:
+            raise self.exception(message) from e
+
+    def blocks(
+            self, id_length: int, length_length: int, message: str, count: typing.Optional[int] = None,
+            encoding: str = "utf-8"
+    ) -> typing.Iterator[typing.Tuple[str, str]]:
+        data = self.data
+        offset = self.offset
+        end = self.end
+        header_length = id_length + length_length
+        remaining = count
+        while (offset < end) if remaining is None else remaining > 0:
+            try:
+                block_id = str(data[offset:offset + id_length], encoding)
+                block_length = int(str(data[offset + id_length:offset + header_length], "ascii"), 10)
+                value = str(data[offset + header_length:offset + header_length + block_length], encoding)
+            except (UnicodeDecodeError, ValueError) as e:
+                raise self.exception(message) from e
+            if block_length < 0:
+                raise self.exception(message)
+            offset = min(offset + header_length + block_length, end)
+            self.offset = offset
+            if remaining is not None:
+                remaining -= 1
+            yield block_id, value
+
+
+def parse_date(value: str, date_format: str = "%d.%m.%Y") -> datetime.date:
+    if date_format == "%d.%m.%Y" and len(value) == 10 and value[2] == "." and value[5] == "." and \
+            value[0:2].isdigit() and value[3:5].isdigit() and value[6:10].isdigit():
+        return datetime.date(int(value[6:10]), int(value[3:5]), int(value[0:2]))
+    return datetime.datetime.strptime(value, date_format).date()
+
+
+def parse_datetime(value: str, date_format: str = "%d.%m.%Y %H:%M") -> datetime.datetime:
+    if date_format == "%d.%m.%Y %H:%M" and len(value) == 16 and value[10] == " " and value[13] == ":" and \
+            value[11:13].isdigit() and value[14:16].isdigit():
+        date = parse_date(value[0:10])
+        return datetime.datetime(date.year, date.month, date.day, int(value[11:13]), int(value[14:16]))
+    return datetime.datetime.strptime(value, date_format)
@@ -1,21 +1,23 @@
 import typing
 import django.core.files.storage
 import json
+from .. import registry
 
-RICS = None
-
-def get_rics_list() -> typing.Dict[str, dict]:
-    global RICS
-
-    if RICS:
-        return RICS
 
+def load_rics() -> registry.Registry[typing.Mapping[str, typing.Any]]:
     uic_storage = django.core.files.storage.storages["uic-data"]
     with uic_storage.open("rics_codes.json", "r") as f:
-        RICS = json.loads(f.read())
+        rics = json.loads(f.read())
+
+    return registry.Registry({int(code): registry.freeze(company) for code, company in rics.items()})
+
+
+RICS = registry.ReferenceData("uic-data", "rics_codes.json", load_rics)
+
 
-    return RICS
+def get_rics(code: int) -> typing.Optional[typing.Mapping[str, typing.Any]]:
+    return RICS.get().get(code)
 
 
-def get_rics(code: int) -> typing.Optional[dict]:
-    return get_rics_list().get(str(code))
\ No newline at end of file
+def get_rics_many(codes: typing.Iterable[int]) -> typing.Dict[int, typing.Optional[typing.Mapping[str, typing.Any]]]:
+    return RICS.get().get_many(codes)
@@ -0,0 +1,227 @@
+import base64
+import collections
+import dataclasses
+import hashlib
+import logging
+import re
+import threading
+import time
+import typing
+import xml.etree.ElementTree
+import django.core.files.storage
+import cryptography.exceptions
+import cryptography.x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import dsa, ec, utils
+from . import util
+from .. import registry
+
+logger = logging.getLogger(__name__)
+
+KEYS_FILENAME = "uic_public_keys.xml"
+CACHE_SIZE = 4096
+
+STATUS_VALID = "valid"
+STATUS_INVALID = "invalid"
+STATUS_UNKNOWN_KEY = "unknown-key"
+STATUS_UNSUPPORTED = "unsupported"
+
+HASH_ALGORITHMS = {
+    "SHA1": hashes.SHA1,
+    "SHA224": hashes.SHA224,
+    "SHA256": hashes.SHA256,
+    "SHA384": hashes.SHA384,
+    "SHA512": hashes.SHA512,
+}
+
+KeyID = typing.Union[int, str]
+
+
+def normalise_key_id(key_id: typing.Union[int, str]) -> KeyID:
+    if isinstance(key_id, str):
+        key_id = key_id.strip()
+        if key_id.isdigit():
+            return int(key_id, 10)
+    return key_id
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class PublicKey:
+    issuer_rics: int
+    key_id: KeyID
+    issuer_name: str
+    algorithm: str
+    barcode_version: typing.Optional[int]
+    key: typing.Union[dsa.DSAPublicKey, ec.EllipticCurvePublicKey] = dataclasses.field(repr=False)
+
+    def hash_algorithm(self) -> hashes.HashAlgorithm:
+        if match := re.match(r"SHA-?(\d+)with", self.algorithm, re.IGNORECASE):
+            if algorithm := HASH_ALGORITHMS.get(f"SHA{match.group(1)}"):
+                return algorithm()
+
+        if isinstance(self.key, dsa.DSAPublicKey):
+            q_bits = self.key.parameters().parameter_numbers().q.bit_length()
+            return hashes.SHA1() if q_bits <= 160 else hashes.SHA224() if q_bits <= 224 else hashes.SHA256()
+        else:
+            return hashes.SHA256() if self.key.key_size <= 256 else \
+                hashes.SHA384() if self.key.key_size <= 384 else hashes.SHA512()
+
+    def verify(self, r: int, s: int, data: bytes) -> bool:
+        signature = utils.encode_dss_signature(r, s)
+        try:
+            if isinstance(self.key, dsa.DSAPublicKey):
+                self.key.verify(signature, data, self.hash_algorithm())
+            else:
+                self.key.verify(signature, data, ec.ECDSA(self.hash_algorithm()))
+        except cryptography.exceptions.InvalidSignature:
+            return False
+        return True
+
+
+def load_key(data: bytes) -> typing.Union[dsa.DSAPublicKey, ec.EllipticCurvePublicKey]:
+    try:
+        key = cryptography.x509.load_der_x509_certificate(data).public_key()
+    except ValueError:
+        key = serialization.load_der_public_key(data)
+
+    if not isinstance(key, (dsa.DSAPublicKey, ec.EllipticCurvePublicKey)):
+        raise util.UICException(f"Unsupported UIC public key type {type(key).__name__}")
+    return key
+
+
+def parse_public_keys(data: bytes) -> typing.Dict[typing.Tuple[int, KeyID], PublicKey]:
+    keys = {}
+    for element in xml.etree.ElementTree.fromstring(data).iter("key"):
+        try:
+            issuer_rics = int(element.findtext("issuerCode", "").strip(), 10)
+            key_id = normalise_key_id(element.findtext("id", ""))
+            barcode_version = element.findtext("barcodeVersion", "").strip()
+            public_key = PublicKey(
+                issuer_rics=issuer_rics,
+                key_id=key_id,
+                issuer_name=element.findtext("issuerName", "").strip(),
+                algorithm=element.findtext("signatureAlgorithm", "").strip(),
+                barcode_version=int(barcode_version, 10) if barcode_version.isdigit() else None,
+                key=load_key(base64.b64decode(element.findtext("publicKey", ""))),
+            )
+        except (ValueError, util.UICException) as e:
+            logger.warning(
+                "Skipping UIC public key %s/%s: %s",
+                element.findtext("issuerCode"), element.findtext("id"), e
+            )
+            continue
+
+        keys[(public_key.issuer_rics, public_key.key_id)] = public_key
+
+    return keys
+
+
+def load_public_keys() -> registry.Registry[PublicKey]:
+    uic_storage = django.core.files.storage.storages["uic-data"]
+    try:
+        with uic_storage.open(KEYS_FILENAME, "rb") as f:
+            return registry.Registry(parse_public_keys(f.read()))
+    except FileNotFoundError:
+        logger.warning("No UIC public keys available")
+        return registry.Registry({})
+
+
+PUBLIC_KEYS = registry.ReferenceData("uic-data", KEYS_FILENAME, load_public_keys)
+
+
+def decode_signature(version: int, signature: bytes) -> typing.Tuple[int, int]:
+    if version == 1:
+        if len(signature) < 2 or signature[0] != 0x30:
+            raise util.UICException("Invalid UIC signature encoding")
+        offset, end = 2, 2 + signature[1]
+        values = []
+        while offset < end and len(values) < 2:
+            if offset + 2 > end or signature[offset] != 0x02:
+                raise util.UICException("Invalid UIC signature encoding")
+            length = signature[offset + 1]
+            if offset + 2 + length > end:
+                raise util.UICException("Invalid UIC signature encoding")
+            values.append(int.from_bytes(signature[offset + 2:offset + 2 + length], "big"))
+            offset += 2 + length
+        if len(values) != 2:
+            raise util.UICException("Invalid UIC signature encoding")
+        return values[0], values[1]
+    elif version == 2:
+        half = len(signature) // 2
+        return int.from_bytes(signature[:half], "big"), int.from_bytes(signature[half:], "big")
+    else:
+        raise util.UICException("Unsupported UIC ticket version")
+
+
+@dataclasses.dataclass(frozen=True)
+class SignatureResult:
+    status: str
+    key: typing.Optional[PublicKey]
+    verify_time: float
+    cached: bool = False
+
+    @property
+    def valid(self) -> bool:
+        return self.status == STATUS_VALID
+
+    @property
+    def verify_time_ms(self) -> float:
+        return self.verify_time * 1000
+
+
+class VerificationCache:
+    def __init__(self):
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key) -> typing.Optional[SignatureResult]:
+        with self.lock:
+            if (result := self.entries.get(key)) is not None:
+                self.entries.move_to_end(key)
+            return result
+
+    def set(self, key, result: SignatureResult):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+VERIFICATION_CACHE = VerificationCache()
+
+
+def verify(envelope, barcode: bytes) -> SignatureResult:
+    keys = PUBLIC_KEYS.get()
+    cache_key = (hashlib.sha256(barcode).digest(), PUBLIC_KEYS.version)
+    if (result := VERIFICATION_CACHE.get(cache_key)) is not None:
+        return dataclasses.replace(result, cached=True)
+
+    start = time.perf_counter()
+    public_key = keys.get((envelope.issuer_rics, normalise_key_id(envelope.signature_key_id)))
+    if not public_key:
+        status = STATUS_UNKNOWN_KEY
+    else:
+        try:
+            r, s = decode_signature(envelope.version, envelope.signature)
+        except util.UICException:
+            status = STATUS_INVALID
+        else:
+            try:
+                valid = public_key.verify(r, s, envelope.signed_data(barcode))
+            except (ValueError, cryptography.exceptions.UnsupportedAlgorithm):
+                status = STATUS_UNSUPPORTED
+            else:
+                status = STATUS_VALID if valid else STATUS_INVALID
+
+    result = SignatureResult(status=status, key=public_key, verify_time=time.perf_counter() - start)
+    logger.debug(
+        "Verified UIC signature for %s/%s: %s in %.2fms",
+        envelope.issuer_rics, envelope.signature_key_id, status, result.verify_time_ms
+    )
+    VERIFICATION_CACHE.set(cache_key, result)
+    return result
@@ -0,0 +1,205 @@
+import bisect
+import collections
+import logging
+import struct
+import sys
+import typing
+import unicodedata
+import zlib
+from . import util, stations
+from .. import registry, storage
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "station_names.index"
+MAGIC = b"UICN"
+VERSION = 2
+# magic, version, entry count, trigram count, posting count
+# followed by entries, sorted name hashes and their entry IDs, sorted trigram hashes, posting offsets, postings and
+# strings
+HEADER = struct.Struct("<4sHIII")
+# normalised name offset, normalised name length, then the station record as in the station index, so that a name
+# resolves without consulting a station index that may have been reloaded separately
+ENTRY = struct.Struct("<IH")
+ENTRY_SIZE = ENTRY.size + stations.STATION.size
+UINT32 = struct.Struct("<I")
+
+MIN_CONFIDENCE = 0.6
+MAX_POSTINGS = 500
+MAX_CANDIDATES = 16
+
+
+def normalise(name: str) -> str:
+    name = unicodedata.normalize("NFKD", name.casefold())
+    name = "".join(c if c.isalnum() else " " for c in name if not unicodedata.combining(c))
+    return " ".join(name.split())
+
+
+def trigrams(normalised_name: str) -> typing.Set[str]:
+    padded = f"  {normalised_name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigram_hash(trigram: str) -> int:
+    return zlib.crc32(trigram.encode("utf-8"))
+
+
+def station_priority(station: dict) -> typing.Tuple[bool, bool, bool]:
+    return bool(station.get("uic")), bool(station.get("is_main_station")), not station.get("is_city")
+
+
+def build_index(station_list: typing.List[dict]) -> bytes:
+    names = {}
+    for i, station in enumerate(station_list):
+        if not station.get("name") or not station.get("latitude") or not station.get("longitude"):
+            continue
+        name = normalise(station["name"])
+        if not name:
+            continue
+        if name not in names or station_priority(station) > station_priority(station_list[names[name]]):
+            names[name] = i
+
+    strings = stations.StringTable()
+    entries = bytearray()
+    name_hashes = []
+    postings = {}
+    for entry_id, (name, position) in enumerate(sorted(names.items(), key=lambda n: n[1])):
+        name_offset, name_length = strings.intern(name)
+        entries += ENTRY.pack(name_offset, name_length) + stations.pack_station(station_list[position], strings)
+        name_hashes.append((zlib.crc32(name.encode("utf-8")), entry_id))
+        for trigram in trigrams(name):
+            postings.setdefault(trigram_hash(trigram), []).append(entry_id)
+    name_hashes.sort()
+
+    trigram_keys = sorted(postings)
+    offsets = [0]
+    posting_data = bytearray()
+    for trigram in trigram_keys:
+        posting_data += b"".join(UINT32.pack(entry_id) for entry_id in postings[trigram])
+        offsets.append(offsets[-1] + len(postings[trigram]))
+
+    return HEADER.pack(MAGIC, VERSION, len(names), len(trigram_keys), offsets[-1]) + \
+        bytes(entries) + \
+        b"".join(UINT32.pack(h) for h, _ in name_hashes) + \
+        b"".join(UINT32.pack(e) for _, e in name_hashes) + \
+        b"".join(UINT32.pack(k) for k in trigram_keys) + \
+        b"".join(UINT32.pack(o) for o in offsets) + \
+        bytes(posting_data) + \
+        bytes(strings.data)
+
+
+class StationNameIndex:
+    def __init__(self, data):
+        if len(data) < HEADER.size:
+            raise util.UICException("Station name index too short")
+
+        magic, version, entry_count, trigram_count, posting_count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise util.UICException("Invalid station name index magic")
+        if version != VERSION:
+            raise util.UICException(f"Unsupported station name index version {version}")
+        if sys.byteorder != "little":
+            raise util.UICException("Station name index requires a little-endian host")
+
+        view = memoryview(data)
+        self.entries_offset = HEADER.size
+        offset = self.entries_offset + ENTRY_SIZE * entry_count
+        self.name_hashes = view[offset:offset + UINT32.size * entry_count].cast("I")
+        offset += UINT32.size * entry_count
+        self.name_entries = view[offset:offset + UINT32.size * entry_count].cast("I")
+        offset += UINT32.size * entry_count
+        self.trigram_keys = view[offset:offset + UINT32.size * trigram_count].cast("I")
+        offset += UINT32.size * trigram_count
+        self.posting_offsets = view[offset:offset + UINT32.size * (trigram_count + 1)].cast("I")
+        offset += UINT32.size * (trigram_count + 1)
+        self.postings = view[offset:offset + UINT32.size * posting_count].cast("I")
+        offset += UINT32.size * posting_count
+        if offset > len(data):
+            raise util.UICException("Station name index truncated")
+
+        self.data = data
+        self.entry_count = entry_count
+        self.strings = view[offset:]
+
+    @classmethod
+    def open(cls) -> "StationNameIndex":
+        return cls(storage.open_mmap("uic-data", INDEX_FILENAME))
+
+    def __len__(self):
+        return self.entry_count
+
+    def memory_usage(self) -> int:
+        return len(self.data)
+
+    def name(self, entry_id: int) -> str:
+        name_offset, name_length = ENTRY.unpack_from(self.data, self.entries_offset + ENTRY_SIZE * entry_id)
+        return str(self.strings[name_offset:name_offset + name_length], "utf-8")
+
+    def station(self, entry_id: int) -> dict:
+        return stations.unpack_station(
+            self.data, self.entries_offset + ENTRY_SIZE * entry_id + ENTRY.size, self.strings
+        )
+
+    def posting_list(self, trigram: str) -> memoryview:
+        key = trigram_hash(trigram)
+        i = bisect.bisect_left(self.trigram_keys, key)
+        if i < len(self.trigram_keys) and self.trigram_keys[i] == key:
+            return self.postings[self.posting_offsets[i]:self.posting_offsets[i + 1]]
+        return self.postings[0:0]
+
+    def find_exact(self, name: str) -> typing.Optional[int]:
+        name_hash = zlib.crc32(name.encode("utf-8"))
+        i = bisect.bisect_left(self.name_hashes, name_hash)
+        while i < len(self.name_hashes) and self.name_hashes[i] == name_hash:
+            if self.name(entry_id := self.name_entries[i]) == name:
+                return entry_id
+            i += 1
+        return None
+
+    def search(self, name: str) -> typing.Optional[typing.Tuple[int, float]]:
+        name = normalise(name)
+        if not name:
+            return None
+        if (entry_id := self.find_exact(name)) is not None:
+            return entry_id, 1.0
+
+        query = trigrams(name)
+        candidates = collections.Counter()
+        total = 0
+        for posting_list in sorted((self.posting_list(trigram) for trigram in query), key=len):
+            if total and total + len(posting_list) > MAX_POSTINGS:
+                break
+            candidates.update(posting_list[:MAX_POSTINGS])
+            total += len(posting_list)
+
+        best = None
+        for entry_id, _ in candidates.most_common(MAX_CANDIDATES):
+            candidate = trigrams(self.name(entry_id))
+            score = 2 * len(query & candidate) / (len(query) + len(candidate))
+            if not best or score > best[1]:
+                best = (entry_id, score)
+
+        return best
+
+
+def load_station_names() -> StationNameIndex:
+    try:
+        return StationNameIndex.open()
+    except (FileNotFoundError, ValueError, util.UICException) as e:
+        logger.warning("Unable to load station name index: %s", e)
+        return StationNameIndex(build_index([]))
+
+
+STATION_NAMES = registry.ReferenceData("uic-data", INDEX_FILENAME, load_station_names)
+
+
+def get_station_by_name(name: str, min_confidence: float = MIN_CONFIDENCE) -> typing.Optional[typing.Tuple[dict, float]]:
+    if not name:
+        return None
+    index = STATION_NAMES.get()
+    if not (match := index.search(name)):
+        return None
+    entry_id, confidence = match
+    if confidence < min_confidence:
+        return None
+    return index.station(entry_id), confidence
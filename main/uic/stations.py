@@ -1,27 +1,199 @@
+import bisect
+import logging
+import math
+import struct
+import sys
 import typing
 import django.core.files.storage
 import json
+from . import util
+from .. import registry, storage
 
-STATIONS = None
+logger = logging.getLogger(__name__)
 
-def get_stations_list() -> typing.Dict[str, typing.Any]:
-    global STATIONS
+INDEX_FILENAME = "stations.index"
+MAGIC = b"UICS"
+VERSION = 1
+# magic, version, station count, UIC key count, DB key count, string table offset
+HEADER = struct.Struct("<4sHIIII")
+# latitude, longitude, UIC code, name offset, time zone offset, name length, time zone length, country
+STATION = struct.Struct("<ddIIIHB2s")
+KEY = struct.Struct("<I")
 
-    if STATIONS:
-        return STATIONS
 
-    uic_storage = django.core.files.storage.storages["uic-data"]
-    with uic_storage.open("stations.json", "r") as f:
-        STATIONS = json.load(f)
+class StringTable:
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = {}
 
-    return STATIONS
+    def intern(self, value: str) -> typing.Tuple[int, int]:
+        encoded = value.encode("utf-8")
+        if encoded not in self.offsets:
+            self.offsets[encoded] = len(self.data)
+            self.data.extend(encoded)
+        return self.offsets[encoded], len(encoded)
+
+
+def station_uic(station: dict) -> int:
+    return int(station["uic"]) if station.get("uic", "").isdigit() and int(station["uic"]) <= 0xFFFFFFFF else 0
+
+
+def pack_station(station: dict, strings: StringTable) -> bytes:
+    name_offset, name_length = strings.intern(station.get("name", ""))
+    time_zone_offset, time_zone_length = strings.intern(station.get("time_zone", ""))
+    return STATION.pack(
+        float(station["latitude"]) if station.get("latitude") else math.nan,
+        float(station["longitude"]) if station.get("longitude") else math.nan,
+        station_uic(station), name_offset, time_zone_offset, name_length, time_zone_length,
+        station.get("country", "").encode("ascii", "replace")[:2],
+    )
+
+
+def unpack_station(data, offset: int, strings: memoryview) -> dict:
+    latitude, longitude, uic, name_offset, time_zone_offset, name_length, time_zone_length, country = \
+        STATION.unpack_from(data, offset)
+
+    return {
+        "name": str(strings[name_offset:name_offset + name_length], "utf-8"),
+        "country": country.decode("ascii"),
+        "uic": str(uic) if uic else None,
+        "latitude": None if math.isnan(latitude) else latitude,
+        "longitude": None if math.isnan(longitude) else longitude,
+        "time_zone": str(strings[time_zone_offset:time_zone_offset + time_zone_length], "utf-8") or None,
+    }
+
+
+def build_index(stations: typing.List[dict]) -> bytes:
+    strings = StringTable()
+    records = bytearray()
+    uic_keys = {}
+    db_keys = {}
+    for i, station in enumerate(stations):
+        records += pack_station(station, strings)
+        if uic := station_uic(station):
+            uic_keys.setdefault(uic, i)
+        if station.get("db_id", "").isdigit() and int(station["db_id"]) <= 0xFFFFFFFF:
+            db_keys.setdefault(int(station["db_id"]), i)
+
+    out = bytearray()
+    for keys in (uic_keys, db_keys):
+        sorted_keys = sorted(keys)
+        out += b"".join(KEY.pack(k) for k in sorted_keys)
+        out += b"".join(KEY.pack(keys[k]) for k in sorted_keys)
+    out += records
+
+    string_table_offset = HEADER.size + len(out)
+    return HEADER.pack(
+        MAGIC, VERSION, len(stations), len(uic_keys), len(db_keys), string_table_offset
+    ) + bytes(out) + bytes(strings.data)
+
+
+class StationIndex:
+    def __init__(self, data):
+        if len(data) < HEADER.size:
+            raise util.UICException("Station index too short")
+
+        magic, version, station_count, uic_count, db_count, string_table_offset = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise util.UICException("Invalid station index magic")
+        if version != VERSION:
+            raise util.UICException(f"Unsupported station index version {version}")
+        if sys.byteorder != "little":
+            raise util.UICException("Station index requires a little-endian host")
+
+        view = memoryview(data)
+        offset = HEADER.size
+        self.uic_keys, offset = view[offset:offset + KEY.size * uic_count].cast("I"), offset + KEY.size * uic_count
+        self.uic_values, offset = view[offset:offset + KEY.size * uic_count].cast("I"), offset + KEY.size * uic_count
+        self.db_keys, offset = view[offset:offset + KEY.size * db_count].cast("I"), offset + KEY.size * db_count
+        self.db_values, offset = view[offset:offset + KEY.size * db_count].cast("I"), offset + KEY.size * db_count
+        self.records_offset = offset
+        if offset + STATION.size * station_count != string_table_offset or string_table_offset > len(data):
+            raise util.UICException("Station index truncated")
+
+        self.data = data
+        self.station_count = station_count
+        self.strings = view[string_table_offset:]
+
+    @classmethod
+    def open(cls) -> "StationIndex":
+        return cls(storage.open_mmap("uic-data", INDEX_FILENAME))
+
+    def __len__(self):
+        return self.station_count
+
+    def memory_usage(self) -> int:
+        return len(self.data)
+
+    @staticmethod
+    def search(keys: memoryview, key: int) -> typing.Optional[int]:
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return i
+        return None
+
+    def station(self, i: int) -> dict:
+        return unpack_station(self.data, self.records_offset + STATION.size * i, self.strings)
+
+    def get_by_uic(self, code: int) -> typing.Optional[dict]:
+        if (i := self.search(self.uic_keys, code)) is not None:
+            return self.station(self.uic_values[i])
+
+    def get_by_db(self, code: int) -> typing.Optional[dict]:
+        if (i := self.search(self.db_keys, code)) is not None:
+            return self.station(self.db_values[i])
+
+
+class JSONStationIndex:
+    def __init__(self, stations: typing.Dict[str, typing.Any]):
+        self.stations = stations
+
+    @classmethod
+    def open(cls) -> "JSONStationIndex":
+        uic_storage = django.core.files.storage.storages["uic-data"]
+        with uic_storage.open("stations.json", "r") as f:
+            return cls(json.load(f))
+
+    def __len__(self):
+        return len(self.stations["stations"])
+
+    def memory_usage(self) -> int:
+        return registry.deep_sizeof(self.stations)
+
+    def station(self, i: int) -> dict:
+        return self.stations["stations"][i]
+
+    def get_by_uic(self, code: int) -> typing.Optional[dict]:
+        if (i := self.stations["uic_codes"].get(str(code))) is not None:
+            return self.stations["stations"][i]
+
+    def get_by_db(self, code: int) -> typing.Optional[dict]:
+        if (i := self.stations["db_ids"].get(str(code))) is not None:
+            return self.stations["stations"][i]
+
+
+def load_stations() -> typing.Union[StationIndex, JSONStationIndex]:
+    try:
+        return StationIndex.open()
+    except (FileNotFoundError, ValueError, util.UICException) as e:
+        logger.warning("Unable to load station index, falling back to stations.json: %s", e)
+        return JSONStationIndex.open()
+
+
+STATIONS = registry.ReferenceData("uic-data", INDEX_FILENAME, load_stations)
 
 
 def get_station_by_uic(code) -> typing.Optional[dict]:
-    if i := get_stations_list()["uic_codes"].get(str(code)):
-        return get_stations_list()["stations"][i]
+    try:
+        code = int(code)
+    except (TypeError, ValueError):
+        return None
+    return STATIONS.get().get_by_uic(code)
 
 
 def get_station_by_db(code) -> typing.Optional[dict]:
-    if i := get_stations_list()["db_ids"].get(str(code)):
-        return get_stations_list()["stations"][i]
\ No newline at end of file
+    try:
+        code = int(code)
+    except (TypeError, ValueError):
+        return None
+    return STATIONS.get().get_by_db(code)
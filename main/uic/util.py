@@ -5,6 +5,9 @@ import pytz
 class UICException(Exception):
     pass
 
+class UICLimitException(UICException):
+    pass
+
 @dataclasses.dataclass
 class Timestamp:
     year: int
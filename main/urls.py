@@ -14,6 +14,7 @@ urlpatterns = [
     path('api/upload', views.api.upload_aztec),
 
     path('account/', views.account.index, name='account'),
+    path('account/tickets.pkpasses', views.account.account_pkpasses, name='account_pkpasses'),
     path('account/db/', views.account.db_account, name='db_account'),
     path('account/db_abo/', views.db_abo.view_db_abo, name='db_abo'),
     path('account/db_abo/new/', views.db_abo.new_abo, name='new_db_abo'),
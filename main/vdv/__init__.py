@@ -2,4 +2,4 @@ from .envelope import EnvelopeV2
 from .util import VDVException
 from .pki import CertificateStore, Certificate, CAReference, CertificateData
 from .ticket import VDVTicket
-from . import org_id
\ No newline at end of file
+from . import org_id, bundle
\ No newline at end of file
@@ -0,0 +1,102 @@
+import dataclasses
+import struct
+import typing
+
+from . import pki, util
+from .. import storage
+
+BUNDLE_FILENAME = "certificates.bundle"
+MAGIC = b"VDVB"
+VERSION = 2
+HEADER = struct.Struct(">4sHI")
+# CAR, data offset, data length - entries only index the raw certificates, which are verified against the root CA
+# when they are loaded like any other certificate
+ENTRY = struct.Struct(">8sII")
+
+
+@dataclasses.dataclass
+class BundleEntry:
+    ca_reference: "pki.CAReference"
+    data: bytes
+
+    def raw_certificate(self) -> "pki.RawCertificate":
+        return pki.RawCertificate(
+            filename=BUNDLE_FILENAME,
+            ca_reference=self.ca_reference,
+            data=self.data
+        )
+
+
+def write_bundle(entries: typing.Iterable[BundleEntry]) -> bytes:
+    entries = sorted(entries, key=lambda e: e.ca_reference.to_bytes())
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, len(entries)))
+    data_offset = HEADER.size + ENTRY.size * len(entries)
+    for entry in entries:
+        out += ENTRY.pack(
+            entry.ca_reference.to_bytes(),
+            data_offset,
+            len(entry.data),
+        )
+        data_offset += len(entry.data)
+
+    for entry in entries:
+        out += entry.data
+
+    return bytes(out)
+
+
+class CertificateBundle:
+    def __init__(self, data):
+        if len(data) < HEADER.size:
+            raise util.VDVException("Certificate bundle too short")
+
+        magic, version, count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise util.VDVException("Invalid certificate bundle magic")
+        if version != VERSION:
+            raise util.VDVException(f"Unsupported certificate bundle version {version}")
+        if len(data) < HEADER.size + ENTRY.size * count:
+            raise util.VDVException("Certificate bundle index truncated")
+        for _, data_offset, data_length in ENTRY.iter_unpack(data[HEADER.size:HEADER.size + ENTRY.size * count]):
+            if data_offset + data_length > len(data):
+                raise util.VDVException("Certificate bundle data truncated")
+
+        self.data = data
+        self.count = count
+
+    @classmethod
+    def open(cls) -> "CertificateBundle":
+        return cls(storage.open_mmap("vdv-certs", BUNDLE_FILENAME))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self) -> typing.Iterator[BundleEntry]:
+        for i in range(self.count):
+            yield self.entry(i)
+
+    def key(self, i: int) -> bytes:
+        offset = HEADER.size + ENTRY.size * i
+        return self.data[offset:offset + 8]
+
+    def entry(self, i: int) -> BundleEntry:
+        car, data_offset, data_length = ENTRY.unpack_from(self.data, HEADER.size + ENTRY.size * i)
+        return BundleEntry(
+            ca_reference=pki.CAReference.from_bytes(car),
+            data=self.data[data_offset:data_offset + data_length]
+        )
+
+    def find(self, ca_reference: "pki.CAReference") -> typing.Optional[BundleEntry]:
+        target = ca_reference.to_bytes()
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.key(mid) < target:
+                low = mid + 1
+            else:
+                high = mid
+
+        if low < self.count and self.key(low) == target:
+            return self.entry(low)
+        return None
@@ -1,13 +1,60 @@
+import collections
 import hashlib
-from . import util, pki
+import threading
+import typing
+from . import util, pki, rsa
+
+RECOVERY_CACHE_SIZE = 1024
+
+
+class RecoveryCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: typing.Hashable) -> typing.Optional[bytes]:
+        with self.lock:
+            message = self.entries.get(key)
+            if message is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return message
+
+    def put(self, key: typing.Hashable, message: bytes):
+        with self.lock:
+            self.entries[key] = message
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> typing.Dict[str, int]:
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+RECOVERY_CACHE = RecoveryCache(RECOVERY_CACHE_SIZE)
 
 
 def decrypt_with_cert(signature: bytes, signature_residual: bytes, ca: "pki.CertificateData") -> bytes:
     assert isinstance(ca.public_key, pki.RSAPublicKey)
 
-    h = int.from_bytes(signature, 'big')
-    m = pow(h, ca.public_key.exponent, ca.public_key.modulus)
-    data = m.to_bytes(ca.public_key.modulus_len, 'big')
+    data = rsa.get_backend().public_operation(ca.public_key, signature)
 
     if data[0] != 0x6A:
         raise util.VDVException("Invalid message header - signature verification failed")
@@ -25,4 +72,14 @@ def decrypt_with_cert(signature: bytes, signature_residual: bytes, ca: "pki.Cert
     if hashlib.sha1(message).digest() != message_hash:
         raise util.VDVException("Invalid message hash - signature verification failed")
 
-    return message
\ No newline at end of file
+    return message
+
+
+def decrypt_with_cert_cached(signature: bytes, signature_residual: bytes, ca: "pki.CertificateData") -> bytes:
+    key = (bytes(signature), bytes(signature_residual), ca.certificate_holder_reference)
+    if message := RECOVERY_CACHE.get(key):
+        return message
+
+    message = decrypt_with_cert(signature, signature_residual, ca)
+    RECOVERY_CACHE.put(key, message)
+    return message
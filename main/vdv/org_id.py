@@ -1,26 +1,48 @@
+import dataclasses
 import typing
 import django.core.files.storage
 import json
+from .. import registry
 
-ORG_IDS = None
 
-def get_org_ids_list() -> typing.Dict[str, dict]:
-    global ORG_IDS
+@dataclasses.dataclass(frozen=True, slots=True)
+class Organisation:
+    org: typing.Mapping[str, typing.Any]
+    is_test: bool
+    display_name: str
 
-    if ORG_IDS:
-        return ORG_IDS
 
+def load_orgs() -> registry.Registry[Organisation]:
     storage = django.core.files.storage.storages["vdv-certs"]
     with storage.open("orgs.json", "r") as f:
-        ORG_IDS = json.loads(f.read())
+        org_list = json.loads(f.read())
 
-    return ORG_IDS
+    orgs = [registry.freeze(org) for org in org_list["orgs"]]
+    entries = {}
+    for code, org_pos in org_list["vdv_test_ids"].items():
+        org = orgs[org_pos]
+        entries[int(code)] = Organisation(org=org, is_test=True, display_name=f"{org['name']} (Test)")
+    for code, org_pos in org_list["vdv_ids"].items():
+        org = orgs[org_pos]
+        entries[int(code)] = Organisation(org=org, is_test=False, display_name=org["name"])
 
+    return registry.Registry(entries)
 
-def get_org(code: int) -> typing.Tuple[typing.Optional[dict], bool]:
-    org_list = get_org_ids_list()
-    if org_pos := org_list["vdv_ids"].get(str(code)):
-        return org_list["orgs"][org_pos], False
-    elif org_pos := org_list["vdv_test_ids"].get(str(code)):
-        return org_list["orgs"][org_pos], True
-    return None, False
\ No newline at end of file
+
+ORG_IDS = registry.ReferenceData("vdv-certs", "orgs.json", load_orgs)
+
+
+def get_org(code: int) -> typing.Tuple[typing.Optional[typing.Mapping[str, typing.Any]], bool]:
+    if org := ORG_IDS.get().get(code):
+        return org.org, org.is_test
+    return None, False
+
+
+def get_org_name(code: int) -> typing.Optional[str]:
+    if org := ORG_IDS.get().get(code):
+        return org.display_name
+    return None
+
+
+def get_orgs(codes: typing.Iterable[int]) -> typing.Dict[int, typing.Optional[Organisation]]:
+    return ORG_IDS.get().get_many(codes)
@@ -1,12 +1,17 @@
+import bisect
 import dataclasses
+import datetime
+import heapq
+import logging
+import threading
 import typing
 import pathlib
-import ber_tlv.tlv
-import hashlib
 import string
 import django.core.files.storage
 
-from . import iso9796, util
+from . import iso9796, util, bundle, rsa, tlv
+
+logger = logging.getLogger(__name__)
 
 ROOT = pathlib.Path(__file__).parent
 SHA1 = [1, 3, 14, 3, 2, 26]
@@ -20,7 +25,7 @@ KNOWN_OIDS = (
 )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True)
 class CAReference:
     name: bytes
     service_indicator: int
@@ -47,15 +52,18 @@ class CAReference:
             return None
 
     def hex_name(self):
-        full_name = self.name + bytes([self.service_indicator, self.algorithm_reference, self.year - 1990])
+        full_name = self.to_bytes()
         return ":".join(f"{full_name[i]:02x}" for i in range(len(full_name)))
 
+    def to_bytes(self) -> bytes:
+        return self.name + bytes([self.service_indicator, self.algorithm_reference, self.year - 1990])
+
     @classmethod
     def from_bytes(cls, data: bytes) -> "CAReference":
         if len(data) != 8:
             raise ValueError("Invalid CA reference length")
         return cls(
-            name=data[0:5],
+            name=bytes(data[0:5]),
             service_indicator=data[5],
             algorithm_reference=data[6],
             year=1990 + data[7]
@@ -73,39 +81,183 @@ class RawCertificate:
     data: bytes
 
 class CertificateStore:
-    certificates: typing.List[RawCertificate]
+    certificates: typing.Dict[CAReference, RawCertificate]
+    verified_certificates: typing.Dict[CAReference, "CertificateData"]
+    expiry_index: typing.List[typing.Tuple[datetime.date, bytes]]
+    expiry_certificates: typing.Dict[CAReference, typing.Tuple[datetime.date, "CertificateData"]]
+    eviction_index: typing.List[typing.Tuple[datetime.date, bytes]]
+    bundle: typing.Optional["bundle.CertificateBundle"]
 
     def __init__(self):
-        self.certificates = []
+        self.certificates = {}
+        self.verified_certificates = {}
+        self.expiry_index = []
+        self.expiry_certificates = {}
+        self.eviction_index = []
+        self.last_expiry_check = None
+        self.bundle = None
+        self.lock = threading.Lock()
+
+    def load_bundle(self):
+        try:
+            certificate_bundle = bundle.CertificateBundle.open()
+        except (FileNotFoundError, ValueError, util.VDVException) as e:
+            logger.warning("Unable to load VDV certificate bundle, falling back to individual certificates: %s", e)
+            return
+
+        with self.lock:
+            self.bundle = certificate_bundle
 
     def load_certificates(self):
-        certificates = []
+        certificates = {}
         certificate_storage = django.core.files.storage.storages["vdv-certs"]
         for filename in certificate_storage.listdir("")[1]:
             if not filename.endswith(".der"):
                 continue
-            with certificate_storage.open(filename, "rb") as f:
-                data = f.read()
             try:
                 car_bytes = bytes.fromhex(filename[:-4])
+                ca_reference = CAReference.from_bytes(car_bytes)
             except ValueError:
                 continue
-            certificates.append(RawCertificate(
+            with certificate_storage.open(filename, "rb") as f:
+                data = f.read()
+            certificates[ca_reference] = RawCertificate(
                 filename=filename,
-                ca_reference=CAReference.from_bytes(car_bytes),
+                ca_reference=ca_reference,
                 data=data
-            ))
-        self.certificates = certificates
+            )
 
-    def find_certificate(self, ca_reference: CAReference) -> typing.Optional[RawCertificate]:
-        for certificate in self.certificates:
-            if certificate.ca_reference.name == ca_reference.name and \
-                    certificate.ca_reference.service_indicator == ca_reference.service_indicator and \
-                    certificate.ca_reference.algorithm_reference == ca_reference.algorithm_reference and \
-                    certificate.ca_reference.year == ca_reference.year:
-                return certificate
+        with self.lock:
+            self.certificates = certificates
+            self.verified_certificates = {}
+            self.expiry_index = []
+            self.expiry_certificates = {}
+            self.eviction_index = []
+            self.last_expiry_check = None
+
+    def fetch_certificate(self, ca_reference: CAReference) -> typing.Optional[RawCertificate]:
+        certificate_storage = django.core.files.storage.storages["vdv-certs"]
+        car_hex = ca_reference.to_bytes().hex()
+        for filename in (f"{car_hex.upper()}.der", f"{car_hex}.der"):
+            try:
+                with certificate_storage.open(filename, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            return RawCertificate(
+                filename=filename,
+                ca_reference=ca_reference,
+                data=data
+            )
         return None
 
+    def find_certificate(self, ca_reference: CAReference) -> typing.Optional[RawCertificate]:
+        with self.lock:
+            certificate = self.certificates.get(ca_reference)
+        if certificate:
+            return certificate
+
+        if self.bundle and (entry := self.bundle.find(ca_reference)):
+            certificate = entry.raw_certificate()
+        else:
+            certificate = self.fetch_certificate(ca_reference)
+        if certificate:
+            with self.lock:
+                self.certificates[ca_reference] = certificate
+        return certificate
+
+    def ca_references(self) -> typing.Set[CAReference]:
+        with self.lock:
+            ca_references = set(self.certificates.keys())
+        if self.bundle:
+            ca_references.update(entry.ca_reference for entry in self.bundle)
+        return ca_references
+
+    def find_verified_certificate(self, ca_reference: CAReference) -> typing.Optional["CertificateData"]:
+        if self.last_expiry_check != (today := datetime.date.today()):
+            self.expire_certificates(today)
+        with self.lock:
+            return self.verified_certificates.get(ca_reference)
+
+    def add_verified_certificate(self, certificate_data: "CertificateData"):
+        ca_reference = certificate_data.certificate_holder_reference
+        try:
+            expiry_date = certificate_data.expiry_date.as_date() if certificate_data.expiry_date else None
+        except ValueError:
+            expiry_date = None
+
+        car = ca_reference.to_bytes()
+        with self.lock:
+            self.verified_certificates[ca_reference] = certificate_data
+            if previous := self.expiry_certificates.pop(ca_reference, None):
+                remove_index_entry(self.expiry_index, (previous[0], car))
+            if expiry_date:
+                self.expiry_certificates[ca_reference] = (expiry_date, certificate_data)
+                bisect.insort(self.expiry_index, (expiry_date, car))
+                if not previous or previous[0] != expiry_date:
+                    heapq.heappush(self.eviction_index, (expiry_date, car))
+
+    def next_expiry(self) -> typing.Optional[datetime.date]:
+        with self.lock:
+            start = bisect.bisect_left(self.expiry_index, (datetime.date.today(), b""))
+            return self.expiry_index[start][0] if start < len(self.expiry_index) else None
+
+    def expiring_before(self, date: datetime.date) -> typing.List["CertificateData"]:
+        with self.lock:
+            end = bisect.bisect_left(self.expiry_index, (date, b""))
+            return [
+                self.expiry_certificates[CAReference.from_bytes(car)][1] for _, car in self.expiry_index[:end]
+            ]
+
+    def expire_certificates(self, today: datetime.date):
+        # Runs at most once a day; an expired certificate is only dropped once storage holds a different
+        # certificate for its CAR, otherwise it would just be fetched and verified again on the next ticket
+        with self.lock:
+            if self.last_expiry_check == today:
+                return
+            self.last_expiry_check = today
+            expired = []
+            while self.eviction_index and self.eviction_index[0][0] < today:
+                expiry_date, car = heapq.heappop(self.eviction_index)
+                ca_reference = CAReference.from_bytes(car)
+                if (entry := self.expiry_certificates.get(ca_reference)) and entry[0] == expiry_date:
+                    expired.append((expiry_date, car, ca_reference, self.certificates.get(ca_reference)))
+
+        for expiry_date, car, ca_reference, certificate in expired:
+            renewed = self.fetch_certificate(ca_reference)
+            with self.lock:
+                if renewed and (not certificate or renewed.data != certificate.data):
+                    logger.info("Replacing expired VDV certificate %s", ca_reference.hex_name())
+                    self.verified_certificates.pop(ca_reference, None)
+                    self.certificates[ca_reference] = renewed
+                else:
+                    heapq.heappush(self.eviction_index, (expiry_date, car))
+
+
+def remove_index_entry(index: typing.List[typing.Tuple[datetime.date, bytes]], entry: typing.Tuple[datetime.date, bytes]):
+    i = bisect.bisect_left(index, entry)
+    if i < len(index) and index[i] == entry:
+        del index[i]
+
+
+CERTIFICATE_STORE = None
+CERTIFICATE_STORE_LOCK = threading.Lock()
+
+
+def get_certificate_store() -> CertificateStore:
+    global CERTIFICATE_STORE
+
+    if CERTIFICATE_STORE:
+        return CERTIFICATE_STORE
+
+    with CERTIFICATE_STORE_LOCK:
+        if not CERTIFICATE_STORE:
+            certificate_store = CertificateStore()
+            certificate_store.load_bundle()
+            CERTIFICATE_STORE = certificate_store
+
+    return CERTIFICATE_STORE
+
 
 @dataclasses.dataclass
 class Certificate:
@@ -115,37 +267,33 @@ class Certificate:
 
     @classmethod
     def parse(cls, raw_cert: RawCertificate):
-        try:
-            elms = ber_tlv.tlv.Tlv.Parser.parse(raw_cert.data, True, [], False, 0)
-        except Exception as e:
-            raise util.VDVException("Failed to parse certificate") from e
-
+        data = memoryview(raw_cert.data)
         certificate = None
 
-        for tag, data in elms:
+        for tag, offset, length in tlv.iter_elements(data):
             if tag == util.TAG_CERTIFICATE:
-                certificate = data
+                certificate = data[offset:offset + length]
             else:
                 raise util.VDVException(f"Unknown tag: {hex(tag)}; likely not a certificate")
 
         if not certificate:
             raise util.VDVException("No certificate present")
 
-        return cls.parse_tags(certificate)
+        return cls.parse_tags(certificate, 1)
 
     @classmethod
-    def parse_tags(cls, certificate: typing.List[typing.Tuple[int, typing.Any]]):
+    def parse_tags(cls, certificate: memoryview, depth: int = 0):
         certificate_content = None
         certificate_signature = None
         certificate_signature_remainder = None
 
-        for tag, data in certificate:
+        for tag, offset, length in tlv.iter_elements(certificate, depth=depth):
             if tag == util.TAG_CERTIFICATE_CONTENT:
-                certificate_content = data
+                certificate_content = bytes(certificate[offset:offset + length])
             elif tag == util.TAG_CERTIFICATE_SIGNATURE:
-                certificate_signature = data
+                certificate_signature = bytes(certificate[offset:offset + length])
             elif tag == util.TAG_CERTIFICATE_SIGNATURE_REMAINDER:
-                certificate_signature_remainder = data
+                certificate_signature_remainder = bytes(certificate[offset:offset + length])
             else:
                 raise util.VDVException(f"Unknown tag: {hex(tag)}")
 
@@ -166,52 +314,13 @@ class Certificate:
         return self.signature_residual is not None and self.content is None
 
     def decrypt_with_ca_key(self, ca: "CertificateData"):
-        self.content = iso9796.decrypt_with_cert(self.signature, self.signature_residual, ca)
+        self.content = iso9796.decrypt_with_cert_cached(self.signature, self.signature_residual, ca)
 
     def verify_signature(self, ca: "CertificateData"):
         assert self.content is not None
         assert isinstance(ca.public_key, RSAPublicKey)
 
-        h = int.from_bytes(self.signature, 'big')
-        m = pow(h, ca.public_key.exponent, ca.public_key.modulus)
-        data = m.to_bytes(ca.public_key.modulus_len, 'big')
-
-        if data[0:2] != b'\x00\x01':
-            raise util.VDVException("Invalid message padding - signature verification failed")
-        offset = 2
-        while data[offset] == 0xff:
-            offset += 1
-        if data[offset] != 0:
-            raise util.VDVException("Invalid message padding - signature verification failed")
-        data = data[offset + 1:]
-
-        data = ber_tlv.tlv.Tlv.Parser.parse(data, True, [], False, 0)
-        if len(data) != 1:
-            raise util.VDVException("Invalid message structure - signature verification failed")
-        if data[0][0] != util.TAG_SEQUENCE:
-            raise util.VDVException("Invalid message structure - signature verification failed")
-        algorithm, signature = data[0][1][0], data[0][1][1]
-
-        if algorithm[0] != util.TAG_SEQUENCE:
-            raise util.VDVException("Invalid message structure - signature verification failed")
-        if algorithm[1][0][0] != util.TAG_OID:
-            raise util.VDVException("Invalid message structure - signature verification failed")
-
-        signature_oid = decode_oid(algorithm[1][0][1])
-        if signature_oid != SHA1:
-            raise util.VDVException("Invalid signature algorithm - signature verification failed")
-
-        if len(algorithm[1]) != 2:
-            raise util.VDVException("Invalid message structure - signature verification failed")
-        if algorithm[1][1][0] != util.TAG_NULL:
-            raise util.VDVException("Invalid message structure - signature verification failed")
-
-        if signature[0] != util.TAG_OCTET_STRING:
-            raise util.VDVException("Invalid message structure - signature verification failed")
-        signature = signature[1]
-
-        if signature != hashlib.sha1(self.content).digest():
-            raise util.VDVException("Invalid signature - signature verification failed")
+        rsa.get_backend().verify_pkcs1_sha1(ca.public_key, self.signature, self.content)
 
 
 @dataclasses.dataclass
@@ -0,0 +1,107 @@
+import functools
+import hashlib
+import typing
+import cryptography.exceptions
+import cryptography.hazmat.primitives.asymmetric.padding
+import cryptography.hazmat.primitives.asymmetric.rsa
+import cryptography.hazmat.primitives.hashes
+import Crypto.Math.Numbers
+from django.conf import settings
+
+from . import util, pki, tlv
+
+
+class PythonBackend:
+    name = "python"
+
+    def public_operation(self, public_key: "pki.RSAPublicKey", data: bytes) -> bytes:
+        h = int.from_bytes(data, 'big')
+        m = pow(h, public_key.exponent, public_key.modulus)
+        return m.to_bytes(public_key.modulus_len, 'big')
+
+    def verify_pkcs1_sha1(self, public_key: "pki.RSAPublicKey", signature: bytes, message: bytes):
+        data = self.public_operation(public_key, signature)
+
+        if data[0:2] != b'\x00\x01':
+            raise util.VDVException("Invalid message padding - signature verification failed")
+        offset = 2
+        while data[offset] == 0xff:
+            offset += 1
+        if data[offset] != 0:
+            raise util.VDVException("Invalid message padding - signature verification failed")
+        data = tlv.elements(memoryview(data)[offset + 1:])
+        if len(data) != 1:
+            raise util.VDVException("Invalid message structure - signature verification failed")
+        if data[0][0] != util.TAG_SEQUENCE:
+            raise util.VDVException("Invalid message structure - signature verification failed")
+
+        digest_info = tlv.elements(data[0][1], 1)
+        if len(digest_info) != 2:
+            raise util.VDVException("Invalid message structure - signature verification failed")
+        algorithm, digest = digest_info
+
+        if algorithm[0] != util.TAG_SEQUENCE:
+            raise util.VDVException("Invalid message structure - signature verification failed")
+        algorithm = tlv.elements(algorithm[1], 2)
+        if not algorithm or algorithm[0][0] != util.TAG_OID:
+            raise util.VDVException("Invalid message structure - signature verification failed")
+
+        signature_oid = pki.decode_oid(algorithm[0][1])
+        if signature_oid != pki.SHA1:
+            raise util.VDVException("Invalid signature algorithm - signature verification failed")
+
+        if len(algorithm) != 2:
+            raise util.VDVException("Invalid message structure - signature verification failed")
+        if algorithm[1][0] != util.TAG_NULL:
+            raise util.VDVException("Invalid message structure - signature verification failed")
+
+        if digest[0] != util.TAG_OCTET_STRING:
+            raise util.VDVException("Invalid message structure - signature verification failed")
+
+        if digest[1] != hashlib.sha1(message).digest():
+            raise util.VDVException("Invalid signature - signature verification failed")
+
+
+class PyCryptodomeBackend(PythonBackend):
+    name = "pycryptodome"
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def load_key(modulus: int, exponent: int) -> typing.Tuple[Crypto.Math.Numbers.Integer, Crypto.Math.Numbers.Integer]:
+        return Crypto.Math.Numbers.Integer(modulus), Crypto.Math.Numbers.Integer(exponent)
+
+    def public_operation(self, public_key: "pki.RSAPublicKey", data: bytes) -> bytes:
+        modulus, exponent = self.load_key(public_key.modulus, public_key.exponent)
+        m = pow(Crypto.Math.Numbers.Integer.from_bytes(data), exponent, modulus)
+        return m.to_bytes(public_key.modulus_len)
+
+
+class CryptographyBackend(PyCryptodomeBackend):
+    # cryptography doesn't expose a raw (unpadded) RSA operation, so ISO 9796-2 message recovery
+    # goes through pycryptodome's GMP integers and only PKCS#1 verification is handed to OpenSSL.
+    name = "cryptography"
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def load_openssl_key(modulus: int, exponent: int) -> cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicKey:
+        return cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicNumbers(exponent, modulus).public_key()
+
+    def verify_pkcs1_sha1(self, public_key: "pki.RSAPublicKey", signature: bytes, message: bytes):
+        key = self.load_openssl_key(public_key.modulus, public_key.exponent)
+        try:
+            key.verify(
+                signature, message,
+                cryptography.hazmat.primitives.asymmetric.padding.PKCS1v15(),
+                cryptography.hazmat.primitives.hashes.SHA1()
+            )
+        except (cryptography.exceptions.InvalidSignature, ValueError) as e:
+            raise util.VDVException("Invalid signature - signature verification failed") from e
+
+
+BACKENDS = {
+    backend.name: backend for backend in (PythonBackend(), CryptographyBackend(), PyCryptodomeBackend())
+}
+
+
+def get_backend() -> PythonBackend:
+    return BACKENDS[settings.VDV_RSA_BACKEND]
@@ -1,9 +1,9 @@
 import dataclasses
 import enum
+import functools
 import typing
-import ber_tlv.tlv
 import re
-from . import util, org_id
+from . import util, org_id, tlv
 
 NAME_TYPE_1_RE = re.compile(r"(?P<start>\w?)(?P<len>\d+)(?P<end>\w?)")
 
@@ -14,29 +14,26 @@ class Context:
     account_surname: typing.Optional[str]
 
 
-@dataclasses.dataclass
 class VDVTicket:
-    version: str
-    ticket_id: int
-    ticket_org_id: int
-    product_number: int
-    product_org_id: int
-    validity_start: util.DateTime
-    validity_end: util.DateTime
-    kvp_org_id: int
-    terminal_type: int
-    terminal_number: int
-    terminal_owner_id: int
-    transaction_time: util.DateTime
-    location_type: int
-    location_number: int
-    location_org_id: int
-    sam_sequence_number_1: int
-    sam_sequence_number_2: int
-    sam_version: int
-    sam_id: int
-    product_data: typing.List
-    product_transaction_data: typing.List
+    def __init__(
+            self,
+            data: bytes,
+            context: Context,
+            product_data: typing.List,
+            common_offset: int,
+            product_transaction_data: typing.List[typing.Tuple[int, int, int]],
+            issue_offset: int,
+    ):
+        self.data = data
+        self.context = context
+        self.product_data = product_data
+        self.common_offset = common_offset
+        self.product_transaction_data_elements = product_transaction_data
+        self.issue_offset = issue_offset
+
+    def __repr__(self):
+        return f"VDVTicket(ticket_id={self.ticket_id}, ticket_org_id={self.ticket_org_id}, " \
+               f"product_number={self.product_number}, product_org_id={self.product_org_id})"
 
     def __str__(self):
         out = "VDVTicket:\n" \
@@ -85,75 +82,142 @@ class VDVTicket:
         if len(data) < 111:
             raise util.VDVException("Invalid VDV ticket length")
 
-        header, data = data[0:18], data[18:]
+        data = bytes(data)
+        view = memoryview(data)
+        end = len(data)
 
+        product_data_tag, product_data_offset, product_data_length = tlv.next_element(view, 18, end) or (0, 0, 0)
+        if product_data_tag != util.TAG_TICKET_PRODUCT_DATA:
+            raise util.VDVException("Not a VDV ticket")
         try:
-            parser = ber_tlv.tlv.Tlv.Parser(data, [], 0)
-            product_data = parser.next()
-        except Exception as e:
-            raise util.VDVException("Invalid VDV ticket") from e
+            product_data = [
+                cls.parse_product_data_element(tag, view[offset:offset + length], context)
+                for tag, offset, length in tlv.iter_elements(
+                    view, product_data_offset, product_data_offset + product_data_length, 1
+                )
+            ]
+        except (ValueError, IndexError) as e:
+            raise util.VDVException("Invalid product data element") from e
+
+        common_offset = product_data_offset + product_data_length
+        product_transaction_data_tag, product_transaction_data_offset, product_transaction_data_length = \
+            tlv.next_element(view, common_offset + 17, end) or (0, 0, 0)
+        if product_transaction_data_tag != util.TAG_TICKET_PRODUCT_TRANSACTION_DATA:
+            raise util.VDVException("Not a VDV ticket")
+        product_transaction_data = list(tlv.iter_elements(
+            view, product_transaction_data_offset, product_transaction_data_offset + product_transaction_data_length, 1
+        ))
 
-        if product_data[0] != 0x85:
+        issue_offset = product_transaction_data_offset + product_transaction_data_length
+        if issue_offset + 12 + 5 > end:
+            raise util.VDVException("Invalid VDV ticket length")
+
+        if data[end - 5:end - 2] != b'VDV':
             raise util.VDVException("Not a VDV ticket")
 
-        product_data = ber_tlv.tlv.Tlv.parse(product_data[1], False, False)
+        return cls(
+            data=data,
+            context=context,
+            product_data=product_data,
+            common_offset=common_offset,
+            product_transaction_data=product_transaction_data,
+            issue_offset=issue_offset,
+        )
+
+    def read_int(self, offset: int, length: int) -> int:
+        return int.from_bytes(self.data[offset:offset + length], 'big')
 
-        offset_1 = parser.get_offset()
-        common_transaction_data, data = data[offset_1:offset_1 + 17], data[offset_1 + 17:]
+    @functools.cached_property
+    def version(self) -> str:
+        return f"{self.data[-2] >> 4}.{self.data[-2] & 0x0F}.{self.data[-1]:02d}"
 
-        try:
-            parser = ber_tlv.tlv.Tlv.Parser(data, [], 0)
-            product_transaction_data = parser.next()
-        except Exception as e:
-            raise util.VDVException("Invalid VDV ticket") from e
+    @functools.cached_property
+    def ticket_id(self) -> int:
+        return self.read_int(0, 4)
 
-        if product_transaction_data[0] != 0x8A:
-            raise util.VDVException("Not a VDV ticket")
+    @functools.cached_property
+    def ticket_org_id(self) -> int:
+        return self.read_int(4, 2)
 
-        product_transaction_data = ber_tlv.tlv.Tlv.parse(product_transaction_data[1], False, False)
+    @functools.cached_property
+    def product_number(self) -> int:
+        return self.read_int(6, 2)
 
-        offset_2 = parser.get_offset()
-        ticket_issue_data, data = data[offset_2:offset_2 + 12], data[offset_2 + 12:]
+    @functools.cached_property
+    def product_org_id(self) -> int:
+        return self.read_int(8, 2)
 
-        trailer = data[-5:]
+    @functools.cached_property
+    def validity_start(self) -> util.DateTime:
+        return util.DateTime.from_bytes(self.data[10:14])
 
-        if trailer[0:3] != b'VDV':
-            raise util.VDVException("Not a VDV ticket")
+    @functools.cached_property
+    def validity_end(self) -> util.DateTime:
+        return util.DateTime.from_bytes(self.data[14:18])
 
-        version = f"{trailer[3] >> 4}.{trailer[3] & 0x0F}.{trailer[4]:02d}"
+    @functools.cached_property
+    def kvp_org_id(self) -> int:
+        return self.read_int(self.common_offset, 2)
 
-        return cls(
-            version=version,
-            ticket_id=int.from_bytes(header[0:4], 'big'),
-            ticket_org_id=int.from_bytes(header[4:6], 'big'),
-            product_number=int.from_bytes(header[6:8], 'big'),
-            product_org_id=int.from_bytes(header[8:10], 'big'),
-            validity_start=util.DateTime.from_bytes(header[10:14]),
-            validity_end=util.DateTime.from_bytes(header[14:18]),
-            kvp_org_id=int.from_bytes(common_transaction_data[0:2], 'big'),
-            terminal_type=common_transaction_data[2],
-            terminal_number=int.from_bytes(common_transaction_data[3:5], 'big'),
-            terminal_owner_id=int.from_bytes(common_transaction_data[5:7], 'big'),
-            transaction_time=util.DateTime.from_bytes(common_transaction_data[7:11]),
-            location_type=common_transaction_data[11],
-            location_number=int.from_bytes(common_transaction_data[12:15], 'big'),
-            location_org_id=int.from_bytes(common_transaction_data[15:17], 'big'),
-            sam_sequence_number_1=int.from_bytes(ticket_issue_data[0:4], 'big'),
-            sam_version=ticket_issue_data[4],
-            sam_sequence_number_2=int.from_bytes(ticket_issue_data[5:9], 'big'),
-            sam_id=int.from_bytes(ticket_issue_data[9:12], 'big'),
-            product_data=list(map(lambda e: cls.parse_product_data_element(e, context), product_data)),
-            product_transaction_data=product_transaction_data
-        )
+    @functools.cached_property
+    def terminal_type(self) -> int:
+        return self.data[self.common_offset + 2]
+
+    @functools.cached_property
+    def terminal_number(self) -> int:
+        return self.read_int(self.common_offset + 3, 2)
+
+    @functools.cached_property
+    def terminal_owner_id(self) -> int:
+        return self.read_int(self.common_offset + 5, 2)
+
+    @functools.cached_property
+    def transaction_time(self) -> util.DateTime:
+        return util.DateTime.from_bytes(self.data[self.common_offset + 7:self.common_offset + 11])
+
+    @functools.cached_property
+    def location_type(self) -> int:
+        return self.data[self.common_offset + 11]
+
+    @functools.cached_property
+    def location_number(self) -> int:
+        return self.read_int(self.common_offset + 12, 3)
+
+    @functools.cached_property
+    def location_org_id(self) -> int:
+        return self.read_int(self.common_offset + 15, 2)
+
+    @functools.cached_property
+    def sam_sequence_number_1(self) -> int:
+        return self.read_int(self.issue_offset, 4)
+
+    @functools.cached_property
+    def sam_version(self) -> int:
+        return self.data[self.issue_offset + 4]
+
+    @functools.cached_property
+    def sam_sequence_number_2(self) -> int:
+        return self.read_int(self.issue_offset + 5, 4)
+
+    @functools.cached_property
+    def sam_id(self) -> int:
+        return self.read_int(self.issue_offset + 9, 3)
+
+    @functools.cached_property
+    def product_transaction_data(self) -> typing.List[typing.Tuple[int, bytes]]:
+        return [
+            (tag, self.data[offset:offset + length])
+            for tag, offset, length in self.product_transaction_data_elements
+        ]
 
     @staticmethod
-    def parse_product_data_element(elm, context: Context) -> typing.Any:
-        if elm[0] == 0xDB:
-            return PassengerData.parse(elm[1], context)
-        elif elm[0] == 0xDC:
-            return SpacialValidity.parse(elm[1])
+    def parse_product_data_element(tag: int, value: memoryview, context: Context) -> typing.Any:
+        if tag == 0xDB:
+            return PassengerData.parse(value, context)
+        elif tag == 0xDC:
+            return SpacialValidity.parse(value)
         else:
-            return UnknownElement(elm[0], elm[1])
+            return UnknownElement(tag, bytes(value))
 
     def product_name(self, opt=False):
         if self.product_number == 9999:
@@ -212,7 +276,7 @@ class Gender(enum.Enum):
     Diverse = 3
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class PassengerData:
     TYPE = "passenger-data"
 
@@ -231,7 +295,7 @@ class PassengerData:
         if len(data) < 5:
             raise util.VDVException("Invalid passenger data element")
 
-        name = data[5:].decode("iso-8859-1", "replace")
+        name = bytes(data[5:]).decode("iso-8859-1", "replace")
         forename = ""
         original_forename = None
         original_surname = None
@@ -303,7 +367,7 @@ class PassengerData:
         )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class SpacialValidity:
     TYPE = "spacial-validity"
 
@@ -325,7 +389,7 @@ class SpacialValidity:
         else:
             return UnknownSpacialValidity(
                 definition_type=data[0],
-                value=data[1:]
+                value=bytes(data[1:])
             )
 
     def organization_name(self):
@@ -370,13 +434,9 @@ class UnknownElement:
 
 
 def map_org_id(code: int, opt=False):
-    org, is_test = org_id.get_org(code)
-    if org:
-        if is_test:
-            return f"{org['name']} (Test)"
-        else:
-            return org['name']
+    if name := org_id.get_org_name(code):
+        return name
     if opt:
         return ""
     else:
-        return str(org_id)
+        return str(code)
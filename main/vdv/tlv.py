@@ -0,0 +1,75 @@
+import typing
+from django.conf import settings
+from . import util
+
+Buffer = typing.Union[bytes, bytearray, memoryview]
+
+
+def read_tag(data: memoryview, offset: int, end: int) -> typing.Tuple[int, int]:
+    tag = data[offset]
+    offset += 1
+    if tag & 0x1F == 0x1F:
+        while True:
+            if offset >= end:
+                raise util.VDVException("Invalid BER-TLV, truncated tag")
+            byte = data[offset]
+            offset += 1
+            tag = (tag << 8) | byte
+            if not byte & 0x80:
+                break
+            if tag > 0xFFFFFF:
+                raise util.VDVException("Invalid BER-TLV, tag too long")
+    return tag, offset
+
+
+def read_length(data: memoryview, offset: int, end: int) -> typing.Tuple[int, int]:
+    if offset >= end:
+        raise util.VDVException("Invalid BER-TLV, truncated length")
+    length = data[offset]
+    offset += 1
+    if length & 0x80:
+        num_bytes = length & 0x7F
+        if num_bytes == 0 or num_bytes > 4:
+            raise util.VDVException("Invalid BER-TLV, unsupported length encoding")
+        if offset + num_bytes > end:
+            raise util.VDVException("Invalid BER-TLV, truncated length")
+        length = int.from_bytes(data[offset:offset + num_bytes], 'big')
+        offset += num_bytes
+    return length, offset
+
+
+def read_element(data: memoryview, offset: int, end: int) -> typing.Tuple[int, int, int]:
+    tag, offset = read_tag(data, offset, end)
+    length, offset = read_length(data, offset, end)
+    if offset + length > end:
+        raise util.VDVException("Invalid BER-TLV, truncated value")
+    return tag, offset, length
+
+
+def next_element(data: memoryview, offset: int, end: int) -> typing.Optional[typing.Tuple[int, int, int]]:
+    while offset < end and data[offset] == 0x00:
+        offset += 1
+    if offset >= end:
+        return None
+    return read_element(data, offset, end)
+
+
+def iter_elements(
+        data: memoryview, offset: int = 0, end: typing.Optional[int] = None, depth: int = 0
+) -> typing.Iterator[typing.Tuple[int, int, int]]:
+    if depth > settings.VDV_MAX_TLV_DEPTH:
+        raise util.VDVLimitException("Invalid BER-TLV, nested too deeply")
+    if end is None:
+        end = len(data)
+    count = 0
+    while element := next_element(data, offset, end):
+        count += 1
+        if count > settings.VDV_MAX_TLV_ELEMENTS:
+            raise util.VDVLimitException("Invalid BER-TLV, too many elements")
+        yield element
+        offset = element[1] + element[2]
+
+
+def elements(data: Buffer, depth: int = 0) -> typing.List[typing.Tuple[int, memoryview]]:
+    data = memoryview(data)
+    return [(tag, data[offset:offset + length]) for tag, offset, length in iter_elements(data, depth=depth)]
@@ -23,7 +23,11 @@ class VDVException(Exception):
     pass
 
 
-@dataclasses.dataclass
+class VDVLimitException(VDVException):
+    pass
+
+
+@dataclasses.dataclass(slots=True)
 class Date:
     year: int
     month: int
@@ -46,8 +50,11 @@ class Date:
             day=un_bcd(data[3:4])
         )
 
+    def to_bytes(self) -> bytes:
+        return to_bcd(self.year, 2) + to_bcd(self.month, 1) + to_bcd(self.day, 1)
 
-@dataclasses.dataclass
+
+@dataclasses.dataclass(slots=True)
 class DateTime:
     year: int
     month: int
@@ -96,4 +103,12 @@ def un_bcd(data: bytes) -> int:
     for i in range(len(data)):
         v *= 100
         v += ((data[i] & 0xF0) >> 4) * 10 + (data[i] & 0x0F)
-    return v
\ No newline at end of file
+    return v
+
+
+def to_bcd(value: int, length: int) -> bytes:
+    out = bytearray(length)
+    for i in range(length - 1, -1, -1):
+        value, digits = divmod(value, 100)
+        out[i] = ((digits // 10) << 4) | (digits % 10)
+    return bytes(out)
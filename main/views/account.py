@@ -1,17 +1,90 @@
+import concurrent.futures
+import logging
 import secrets
 import niquests
+import django.db
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, redirect
-from . import db
+from django.utils import timezone
+from main import models, pkpass, ticket
+from . import db, passes
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_WORKERS = 4
+LISTING_UIC_COLUMNS = ("ticket_kind", "from_station_code", "to_station_code", "product_id", "class_code", "traveller_hash")
 
 @login_required
 def index(request):
+    latest_uic = models.UICTicketInstance.objects.filter(ticket=OuterRef("pk")).order_by("-issuing_time")
+    tickets = request.user.account.tickets.annotate(**{
+        f"uic_{column}": Subquery(latest_uic.values(column)[:1]) for column in LISTING_UIC_COLUMNS
+    })
     return render(request, "main/account/index.html", {
         "user": request.user,
-        "tickets": request.user.account.tickets,
+        "tickets": tickets,
+        "traveller_hash": ticket.traveller_hash(request.user.first_name, request.user.last_name),
     })
 
+def current_tickets(account: models.Account):
+    now = timezone.now()
+    return account.tickets.filter(
+        Exists(models.UICTicketInstance.objects.filter(ticket=OuterRef("pk")).filter(
+            ~Q(validity_end__lt=now) | Q(validity_end__isnull=True)
+        )) | Exists(models.VDVTicketInstance.objects.filter(ticket=OuterRef("pk")).filter(
+            ~Q(validity_end__lt=now) | Q(validity_end__isnull=True)
+        ))
+    ).order_by("pk")
+
+
+def bundle_pkpass(ticket_obj: models.Ticket):
+    try:
+        return passes.pkpass_artifact(ticket_obj)
+    except Exception:
+        logger.exception("Unable to build pass for %s", ticket_obj.pk)
+        return None
+    finally:
+        django.db.connection.close()
+
+
+def bundle_pkpasses(tickets):
+    tickets = iter(tickets)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=BUNDLE_WORKERS)
+    try:
+        pending = set()
+        while True:
+            while len(pending) < BUNDLE_WORKERS * 2 and (ticket_obj := next(tickets, None)):
+                future = executor.submit(bundle_pkpass, ticket_obj)
+                future.ticket_id = ticket_obj.pk
+                pending.add(future)
+            if not pending:
+                return
+
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if (data := future.result()) is not None:
+                    yield f"{future.ticket_id}.pkpass", data
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@login_required
+def account_pkpasses(request):
+    tickets = list(current_tickets(request.user.account))
+    if not tickets:
+        messages.add_message(request, messages.INFO, "You don't have any current tickets")
+        return redirect('account')
+
+    response = StreamingHttpResponse(
+        pkpass.stream_archive(bundle_pkpasses(tickets)), content_type="application/vnd.apple.pkpasses"
+    )
+    response["Content-Disposition"] = 'attachment; filename="tickets.pkpasses"'
+    return response
+
+
 @login_required
 def db_account(request):
     context = {}
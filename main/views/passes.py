@@ -1,15 +1,19 @@
 import datetime
+import functools
+import hashlib
 import json
+import time
+import typing
 import urllib.parse
 import pytz
 import pymupdf
+import cryptography.hazmat.primitives.hashes
 from django.utils import timezone
 from django.shortcuts import render, redirect, get_object_or_404, reverse
 from django.http import HttpResponse
-from django.core.files.storage import storages
 from django.conf import settings
 from django.db.models import Q
-from main import forms, models, ticket, pkpass, vdv, aztec, templatetags, apn
+from main import forms, models, ticket, pkpass, uic, vdv, aztec, templatetags, apn
 
 
 def index(request):
@@ -62,7 +66,9 @@ def index(request):
 
     if ticket_bytes:
         try:
-            ticket_data = ticket.parse_ticket(ticket_bytes, request.user.account if request.user.is_authenticated else None)
+            ticket_data = ticket.parse_ticket(
+                ticket_bytes, request.user.account if request.user.is_authenticated else None, summary=True
+            )
         except ticket.TicketError as e:
             error = {
                 "title": e.title,
@@ -101,14 +107,9 @@ def view_ticket(request, pk):
 
 
 def add_pkp_img(pkp, img_name: str, pass_path: str):
-    img_name, img_name_ext = img_name.rsplit(".", 1)
     pass_path, pass_path_ext = pass_path.rsplit(".", 1)
-    img_1x = storages["staticfiles"].open(f"{img_name}.{img_name_ext}", "rb").read()
-    pkp.add_file(f"{pass_path}.{pass_path_ext}", img_1x)
-    img_2x = storages["staticfiles"].open(f"{img_name}@2x.{img_name_ext}", "rb").read()
-    pkp.add_file(f"{pass_path}@2x.{pass_path_ext}", img_2x)
-    img_3x = storages["staticfiles"].open(f"{img_name}@3x.{img_name_ext}", "rb").read()
-    pkp.add_file(f"{pass_path}@3x.{pass_path_ext}", img_3x)
+    for scale, asset in zip(pkpass.IMAGE_SCALES, pkpass.STATIC_ASSETS.get_image_set(img_name)):
+        pkp.add_asset(f"{pass_path}{scale}.{pass_path_ext}", asset)
 
 
 def ticket_pkpass(request, pk):
@@ -116,13 +117,105 @@ def ticket_pkpass(request, pk):
     return make_pkpass(ticket_obj)
 
 
-def make_pkpass(ticket_obj: models.Ticket):
+def select_pkpass_instance(
+        ticket_obj: models.Ticket
+) -> typing.Union[models.UICTicketInstance, models.VDVTicketInstance, None]:
     now = timezone.now()
-    ticket_instance: models.UICTicketInstance = ticket_obj.uic_instances.filter(
-        ~Q(validity_end__lt=now) | Q(validity_end__isnull=True),
-    ).order_by("validity_start").first()
-    if not ticket_instance:
-        ticket_instance = ticket_obj.uic_instances.order_by("-validity_end").first()
+    for instances in (ticket_obj.uic_instances, ticket_obj.vdv_instances):
+        ticket_instance = instances.filter(
+            ~Q(validity_end__lt=now) | Q(validity_end__isnull=True),
+        ).order_by("validity_start").first()
+        if not ticket_instance:
+            ticket_instance = instances.order_by("-validity_end").first()
+        if ticket_instance:
+            return ticket_instance
+    return None
+
+
+PKPASS_BUILD_VERSION = 1
+PKPASS_REFERENCE_DATA = (
+    uic.stations.STATIONS, uic.station_names.STATION_NAMES, uic.rics.RICS, vdv.org_id.ORG_IDS
+)
+
+
+@functools.cache
+def pkpass_static_fingerprint() -> bytes:
+    fingerprint = hashlib.sha256(f"{PKPASS_BUILD_VERSION}\n".encode("utf-8"))
+    for certificate in (settings.PKPASS_CERTIFICATE, settings.WWDR_CERTIFICATE):
+        fingerprint.update(
+            certificate.fingerprint(cryptography.hazmat.primitives.hashes.SHA256()) if certificate else b"none"
+        )
+    fingerprint.update(json.dumps([settings.PKPASS_CONF, settings.EXTERNAL_URL_BASE], sort_keys=True).encode("utf-8"))
+    for lang, asset in sorted(PASS_STRING_ASSETS.items()):
+        fingerprint.update(f"{lang}:{asset.file_hash}\n".encode("utf-8"))
+    fingerprint.update(pkpass.STATIC_ASSETS.directory_hash("pass"))
+    return fingerprint.digest()
+
+
+def pkpass_build_fingerprint() -> str:
+    fingerprint = hashlib.sha256(pkpass_static_fingerprint())
+    for reference_data in PKPASS_REFERENCE_DATA:
+        try:
+            reference_data.get()
+        except FileNotFoundError:
+            pass
+        fingerprint.update(f"\n{reference_data.filename}:{reference_data.version}".encode("utf-8"))
+    return fingerprint.hexdigest()[:16]
+
+
+def pkpass_artifact_key(
+        ticket_obj: models.Ticket,
+        ticket_instance: typing.Union[models.UICTicketInstance, models.VDVTicketInstance, None]
+) -> str:
+    key = hashlib.sha256(f"{ticket_obj.ticket_type}\n{ticket_obj.pkpass_authentication_token}\n".encode("utf-8"))
+    if ticket_instance:
+        key.update(f"{ticket_instance._meta.model_name}-{ticket_instance.pk}\n".encode("utf-8"))
+        key.update(bytes(ticket_instance.barcode_data))
+        if isinstance(ticket_instance, models.VDVTicketInstance) and ticket_obj.account:
+            user = ticket_obj.account.user
+            key.update(f"\n{user.first_name}\n{user.last_name}".encode("utf-8"))
+    return f"{pkpass_build_fingerprint()}-{key.hexdigest()[:32]}"
+
+
+def pkpass_artifact(ticket_obj: models.Ticket, refresh: bool = False) -> bytes:
+    ticket_instance = select_pkpass_instance(ticket_obj)
+    return pkpass.ARTIFACTS.get_or_build(
+        ticket_obj.pk, pkpass_artifact_key(ticket_obj, ticket_instance),
+        lambda: build_pkpass(ticket_obj, ticket_instance), refresh
+    )
+
+
+def regenerate_pkpasses(
+        ticket_ids: typing.List[str], touch: bool = False
+) -> typing.List[typing.Tuple[str, float, typing.Optional[str]]]:
+    results = []
+    for ticket_id in ticket_ids:
+        start = time.perf_counter()
+        try:
+            ticket_obj = models.Ticket.objects.get(id=ticket_id)
+            if touch:
+                ticket_obj.last_updated = timezone.now()
+                ticket_obj.save(update_fields=["last_updated"])
+            pkpass_artifact(ticket_obj, refresh=True)
+        except Exception as e:
+            results.append((ticket_id, time.perf_counter() - start, f"{type(e).__name__}: {e}"))
+        else:
+            results.append((ticket_id, time.perf_counter() - start, None))
+    return results
+
+
+def make_pkpass(ticket_obj: models.Ticket):
+    response = HttpResponse()
+    response['Content-Type'] = "application/vnd.apple.pkpass"
+    response['Content-Disposition'] = f'attachment; filename="{ticket_obj.pk}.pkpass"'
+    response.write(pkpass_artifact(ticket_obj))
+    return response
+
+
+def build_pkpass(
+        ticket_obj: models.Ticket,
+        ticket_instance: typing.Union[models.UICTicketInstance, models.VDVTicketInstance, None]
+) -> bytes:
     pkp = pkpass.PKPass()
     have_logo = False
 
@@ -151,7 +244,7 @@ def make_pkpass(ticket_obj: models.Ticket):
         "backFields": []
     }
 
-    if ticket_instance:
+    if isinstance(ticket_instance, models.UICTicketInstance):
         ticket_data: ticket.UICTicket = ticket_instance.as_ticket()
         issued_at = ticket_data.issuing_time().astimezone(pytz.utc)
         issuing_rics = ticket_data.issuing_rics()
@@ -193,12 +286,19 @@ def make_pkpass(ticket_obj: models.Ticket):
                     pass_json["expirationDate"] = validity_end.strftime("%Y-%m-%dT%H:%M:%SZ")
                     pass_json["relevantDate"] = validity_start.strftime("%Y-%m-%dT%H:%M:%SZ")
 
-                    if "fromStationNum" in document and "toStationNum" in document:
+                    from_station_name = document.get("fromStationNameUTF8") or document.get("fromStationIA5")
+                    to_station_name = document.get("toStationNameUTF8") or document.get("toStationIA5")
+                    if ("fromStationNum" in document or from_station_name) and \
+                            ("toStationNum" in document or to_station_name):
                         pass_type = "boardingPass"
                         pass_fields["transitType"] = "PKTransitTypeTrain"
 
-                        from_station = templatetags.rics.get_station(document["fromStationNum"], document["stationCodeTable"])
-                        to_station = templatetags.rics.get_station(document["toStationNum"], document["stationCodeTable"])
+                        from_station = templatetags.rics.get_station(
+                            document.get("fromStationNum"), document.get("stationCodeTable")
+                        ) or templatetags.rics.get_station_by_name(from_station_name)
+                        to_station = templatetags.rics.get_station(
+                            document.get("toStationNum"), document.get("stationCodeTable")
+                        ) or templatetags.rics.get_station_by_name(to_station_name)
 
                         if "classCode" in document:
                             pass_fields["auxiliaryFields"].append({
@@ -556,12 +656,15 @@ def make_pkpass(ticket_obj: models.Ticket):
                     "value": ticket_data.db_bl.product,
                 })
 
-            if ticket_data.db_bl.from_station_uic and ticket_data.db_bl.to_station_uic:
+            if (ticket_data.db_bl.from_station_uic or ticket_data.db_bl.from_station_name) and \
+                    (ticket_data.db_bl.to_station_uic or ticket_data.db_bl.to_station_name):
                 pass_type = "boardingPass"
                 pass_fields["transitType"] = "PKTransitTypeTrain"
 
-                from_station = templatetags.rics.get_station(ticket_data.db_bl.from_station_uic, "db")
-                to_station = templatetags.rics.get_station(ticket_data.db_bl.to_station_uic, "db")
+                from_station = templatetags.rics.get_station(ticket_data.db_bl.from_station_uic, "db") or \
+                    templatetags.rics.get_station_by_name(ticket_data.db_bl.from_station_name)
+                to_station = templatetags.rics.get_station(ticket_data.db_bl.to_station_uic, "db") or \
+                    templatetags.rics.get_station_by_name(ticket_data.db_bl.to_station_name)
 
                 if from_station:
                     pass_fields["primaryFields"].append({
@@ -608,8 +711,8 @@ def make_pkpass(ticket_obj: models.Ticket):
                         "value": to_station["name"],
                         "semantics": {
                             "destinationLocation": {
-                                "latitude": float(from_station["latitude"]),
-                                "longitude": float(from_station["longitude"]),
+                                "latitude": float(to_station["latitude"]),
+                                "longitude": float(to_station["longitude"]),
                             },
                             "destinationStationName": to_station["name"]
                         }
@@ -806,11 +909,6 @@ def make_pkpass(ticket_obj: models.Ticket):
             "value": issued_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
         })
     else:
-        ticket_instance: models.VDVTicketInstance = ticket_obj.vdv_instances.filter(
-            ~Q(validity_end__lt=now) | Q(validity_end__isnull=True),
-        ).order_by("validity_start").first()
-        if not ticket_instance:
-            ticket_instance = ticket_obj.vdv_instances.order_by("-validity_end").first()
         if ticket_instance:
             ticket_data: ticket.VDVTicket = ticket_instance.as_ticket()
 
@@ -923,8 +1021,8 @@ def make_pkpass(ticket_obj: models.Ticket):
 
     pass_json[pass_type] = pass_fields
 
-    for lang, strings in PASS_STRINGS.items():
-        pkp.add_file(f"{lang}.lproj/pass.strings", strings.encode("utf-8"))
+    for lang, strings in PASS_STRING_ASSETS.items():
+        pkp.add_asset(f"{lang}.lproj/pass.strings", strings)
 
     if not have_logo:
         add_pkp_img(pkp, "pass/logo.png", "logo.png")
@@ -936,12 +1034,7 @@ def make_pkpass(ticket_obj: models.Ticket):
 
     pkp.add_file("pass.json", json.dumps(pass_json).encode("utf-8"))
     pkp.sign()
-
-    response = HttpResponse()
-    response['Content-Type'] = "application/vnd.apple.pkpass"
-    response['Content-Disposition'] = f'attachment; filename="{ticket_obj.pk}.pkpass"'
-    response.write(pkp.get_buffer())
-    return response
+    return pkp.get_buffer()
 
 
 PASS_STRINGS = {
@@ -1007,6 +1100,10 @@ PASS_STRINGS = {
 """
 }
 
+PASS_STRING_ASSETS = {
+    lang: pkpass.Asset.from_bytes(strings.encode("utf-8")) for lang, strings in PASS_STRINGS.items()
+}
+
 RICS_LOGO = {
     80: "pass/logo-db.png",
     1080: "pass/logo-db.png",
@@ -0,0 +1,45 @@
+def warm_registries(worker):
+    from main import vdv, uic
+
+    for name, lazy_registry in (
+        ("VDV organisation", vdv.org_id.ORG_IDS),
+        ("RICS", uic.rics.RICS),
+        ("station", uic.stations.STATIONS),
+        ("station name", uic.station_names.STATION_NAMES),
+    ):
+        try:
+            registry = lazy_registry.get()
+        except Exception:
+            worker.log.exception(f"Unable to load {name} registry")
+            continue
+        worker.log.info(f"Loaded {name} registry with {len(registry)} entries ({registry.memory_usage()} bytes)")
+
+
+def warm_vdv_pki(worker):
+    from main import ticket
+
+    try:
+        report = ticket.warm_vdv_pki()
+    except ticket.TicketError as e:
+        worker.log.error(f"Unable to warm VDV PKI: {e.message}")
+        return
+    except Exception:
+        worker.log.exception("Unable to warm VDV PKI")
+        return
+
+    worker.log.info(
+        f"Warmed VDV PKI with {len(report.verified)} certificates, {len(report.failed)} failed, "
+        f"next expiry {report.next_expiry}"
+    )
+    for ca_reference, e in report.failed:
+        worker.log.warning(f"Unable to verify VDV certificate {ca_reference.hex_name()}: {e.title}")
+    for certificate_data in report.expiring:
+        worker.log.warning(
+            f"VDV certificate {certificate_data.certificate_holder_reference.hex_name()} "
+            f"expires {certificate_data.expiry_date}"
+        )
+
+
+def post_worker_init(worker):
+    warm_registries(worker)
+    warm_vdv_pki(worker)
@@ -173,6 +173,18 @@ PKPASS_CONF = {
 
 AZTEC_JAR_PATH = BASE_DIR / "aztec-1.0.jar"
 
+VDV_RSA_BACKEND = os.getenv("VDV_RSA_BACKEND", "python")
+VDV_PARSE_WORKERS = int(os.getenv("VDV_PARSE_WORKERS", "1"))
+REFERENCE_DATA_REVALIDATE_INTERVAL = int(os.getenv("REFERENCE_DATA_REVALIDATE_INTERVAL", "300"))
+UIC_FLEX_CACHE_SIZE = int(os.getenv("UIC_FLEX_CACHE_SIZE", "256"))
+UIC_FLEX_CACHE_ALIAS = os.getenv("UIC_FLEX_CACHE_ALIAS")
+UIC_MAX_DECOMPRESSED_SIZE = int(os.getenv("UIC_MAX_DECOMPRESSED_SIZE", "65536"))
+UIC_MAX_RECORDS = int(os.getenv("UIC_MAX_RECORDS", "64"))
+UIC_MAX_LAYOUT_FIELDS = int(os.getenv("UIC_MAX_LAYOUT_FIELDS", "256"))
+VDV_MAX_TLV_DEPTH = int(os.getenv("VDV_MAX_TLV_DEPTH", "4"))
+VDV_MAX_TLV_ELEMENTS = int(os.getenv("VDV_MAX_TLV_ELEMENTS", "256"))
+PKPASS_ARTIFACT_ROOT = os.getenv("PKPASS_ARTIFACT_ROOT")
+
 LOGIN_URL = "magiclink:login"
 LOGIN_REDIRECT_URL = "account"
 LOGOUT_REDIRECT_URL = "index"
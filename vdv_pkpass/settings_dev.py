@@ -166,6 +166,18 @@ PKPASS_CONF = {
 
 AZTEC_JAR_PATH = BASE_DIR / "aztec" / "target" / "aztec-1.0.jar"
 
+VDV_RSA_BACKEND = "python"
+VDV_PARSE_WORKERS = 1
+REFERENCE_DATA_REVALIDATE_INTERVAL = 60
+UIC_FLEX_CACHE_SIZE = 256
+UIC_FLEX_CACHE_ALIAS = None
+UIC_MAX_DECOMPRESSED_SIZE = 65536
+UIC_MAX_RECORDS = 64
+UIC_MAX_LAYOUT_FIELDS = 256
+VDV_MAX_TLV_DEPTH = 4
+VDV_MAX_TLV_ELEMENTS = 256
+PKPASS_ARTIFACT_ROOT = None
+
 STORAGES = {
     "default": {
         "BACKEND": "django.core.files.storage.FileSystemStorage",